@@ -0,0 +1,43 @@
+# encoding: utf-8
+"""
+Synthetic models for the benchmarks: one wide model per collection size with
+fields of every type ModelFilterCollectionMetaclass maps, all pointing to a
+large Customer table.
+"""
+
+from django.db import models
+
+
+SIZES = (10, 30, 60)
+
+STATUSES = [('n', 'New'), ('p', 'Paid'), ('s', 'Shipped'), ('c', 'Cancelled')]
+
+
+class Customer(models.Model):
+    name = models.CharField(max_length=100, db_index=True)
+
+
+FIELD_TYPES = [
+    lambda: models.CharField(max_length=50),
+    lambda: models.CharField(max_length=50, blank=True),
+    lambda: models.TextField(blank=True),
+    lambda: models.IntegerField(),
+    lambda: models.IntegerField(null=True, blank=True),
+    lambda: models.DecimalField(max_digits=10, decimal_places=2),
+    lambda: models.FloatField(),
+    lambda: models.DateTimeField(),
+    lambda: models.DateField(null=True, blank=True),
+    lambda: models.BooleanField(default=False),
+    lambda: models.CharField(max_length=1, choices=STATUSES),
+    lambda: models.ForeignKey(Customer, null=True, blank=True, related_name='+', on_delete=models.CASCADE),
+]
+
+
+def make_model(size):
+    attrs = {'__module__': __name__}
+    for i in range(size):
+        attrs['f%d' % i] = FIELD_TYPES[i % len(FIELD_TYPES)]()
+    return type(str('Wide%d' % size), (models.Model,), attrs)
+
+
+WIDE_MODELS = dict((size, make_model(size)) for size in SIZES)
@@ -0,0 +1,197 @@
+# coding: utf-8
+"""
+Offline benchmarks of the filter hot paths on SQLite:
+
+    python -m benchmarks.run [--customers N] [--rows N] [--save FILE] [--compare FILE]
+
+For every collection size in benchapp.models.SIZES it measures wall time,
+peak allocated memory and SQL queries of collection construction,
+update_qs(), rendering of all unbound subforms and the ww_filters inclusion
+tag. --save writes the results as a baseline, --compare fails (exit code 1)
+when a stage is slower than the baseline by more than --tolerance or runs
+more queries.
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import os
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def setup(customers, rows):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.db.models import fields, ForeignKey
+    from .benchapp.models import Customer, WIDE_MODELS
+
+    with connection.schema_editor() as schema_editor:
+        schema_editor.create_model(Customer)
+        for model in WIDE_MODELS.values():
+            schema_editor.create_model(model)
+
+    Customer.objects.bulk_create([Customer(name='Customer %d' % i) for i in range(customers)])
+    customer_ids = list(Customer.objects.values_list('pk', flat=True))
+
+    def value(field, i):
+        if isinstance(field, ForeignKey):
+            return customer_ids[i % len(customer_ids)]
+        if field.choices:
+            return field.choices[i % len(field.choices)][0]
+        if isinstance(field, fields.BooleanField):
+            return i % 2 == 0
+        if isinstance(field, fields.DateTimeField):
+            return datetime.datetime(2015, 1, 1) + datetime.timedelta(hours=i)
+        if isinstance(field, fields.DateField):
+            return datetime.date(2015, 1, 1) + datetime.timedelta(days=i % 1000)
+        if isinstance(field, fields.DecimalField):
+            return decimal.Decimal(i) / 100
+        if isinstance(field, (fields.IntegerField, fields.FloatField)):
+            return i
+        return 'value %d' % i
+
+    for model in WIDE_MODELS.values():
+        model_fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        model.objects.bulk_create([model(**dict((f.attname, value(f, i)) for f in model_fields))
+                                   for i in range(rows)], batch_size=500)
+
+
+def collections():
+    from django.conf import settings
+    from ww_filters.filter_collections import ModelFilterCollection
+    from .benchapp.models import WIDE_MODELS
+
+    result = {}
+    for size, model in sorted(WIDE_MODELS.items()):
+        meta = type(str('Meta'), (object,), {'model': model})
+        collection = type(str('Wide%dFilters' % size), (ModelFilterCollection,),
+                          {'Meta': meta, '__module__': __name__})
+        settings.FILTERS_BY_TYPE['wide%d' % size] = (collection, model)
+        result[size] = collection, model
+    return result
+
+
+def request_data():
+    return {
+        'f0_filter': 'starts_with', 'f0_filter-value': 'value 1',
+        'f3_filter': 'greater_than', 'f3_filter-value': '10',
+        'f9_filter': 'true',
+    }
+
+
+def measure(func, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    func()  # warm up caches and lazy imports
+    # time without tracing, tracemalloc slows allocations down severalfold
+    start = time.time()
+    for i in range(repeat):
+        func()
+    elapsed = time.time() - start
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        for i in range(repeat):
+            func()
+    peak = 0
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        'time_ms': elapsed * 1000 / repeat,
+        'peak_kb': peak / 1024.0,
+        'queries': len(queries) / float(repeat),
+    }
+
+
+def stages(collection, model, type_):
+    from django.template import Context, Template
+
+    tag = Template('{% load ww_filters %}{% ww_filters type %}')
+    data = request_data()
+
+    def construct():
+        return collection(model.objects.all(), data)
+
+    def update_qs():
+        return construct().update_qs()
+
+    def fetch_page():
+        return list(construct().update_qs()[:50])
+
+    def render_subforms():
+        filter_collection = construct()
+        filter_collection.update_qs()
+        return [u.render() for f in filter_collection.filters.values() for u in f.updaters.values()]
+
+    def render_tag():
+        filter_collection = construct()
+        filter_collection.update_qs()
+        return tag.render(Context({'filter_collection': filter_collection, 'type': type_}))
+
+    return [
+        ('construct', construct, 200),
+        ('update_qs', update_qs, 200),
+        ('fetch_page', fetch_page, 20),
+        ('render_subforms', render_subforms, 5),
+        ('render_tag', render_tag, 5),
+    ]
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['time_ms'] > base['time_ms'] * tolerance:
+            regressions.append('%s: %.2f ms, baseline %.2f ms' % (key, result['time_ms'], base['time_ms']))
+        if result['queries'] > base['queries']:
+            regressions.append('%s: %.1f queries, baseline %.1f' % (key, result['queries'], base['queries']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=20000, help='rows of the foreign key table')
+    parser.add_argument('--rows', type=int, default=2000, help='rows of every filtered table')
+    parser.add_argument('--save', metavar='FILE', help='write results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a baseline')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    setup(args.customers, args.rows)
+    results = {}
+    print('%-18s %5s %12s %12s %9s' % ('stage', 'size', 'time, ms', 'peak, KiB', 'queries'))
+    for size, (collection, model) in sorted(collections().items()):
+        for name, func, repeat in stages(collection, model, 'wide%d' % size):
+            result = results['%s/%d' % (name, size)] = measure(func, repeat)
+            print('%-18s %5d %12.2f %12.1f %9.1f' % (name, size, result['time_ms'], result['peak_kb'],
+                                                    result['queries']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
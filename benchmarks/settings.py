@@ -0,0 +1,30 @@
+# Settings of the offline benchmark suite, see benchmarks/run.py
+
+SECRET_KEY = 'benchmarks'
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'bootstrap3',
+    'ww_filters',
+    'benchmarks.benchapp',
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'APP_DIRS': True,
+}]
+
+ROOT_URLCONF = 'benchmarks.urls'
+USE_TZ = False
+
+FILTERS_BY_TYPE = {}
@@ -0,0 +1,5 @@
+from django.conf.urls import include, url
+
+urlpatterns = [
+    url(r'^filters/', include('ww_filters.urls', namespace='filters')),
+]
@@ -0,0 +1,186 @@
+# coding: utf-8
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.utils.encoding import force_bytes
+
+
+def make_key(*parts):
+    """
+    Cache key safe for every cache backend (no spaces, bounded length).
+    """
+    return 'ww_filters:' + hashlib.md5(force_bytes(':'.join(str(p) for p in parts))).hexdigest()
+
+
+class LRUCache(object):
+    """
+    Small thread-safe in-process cache that evicts the least recently used
+    entry when full. Entries may be given a timeout in seconds.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires < time.time():
+                return default
+            self._data[key] = (expires, value)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if self.maxsize <= 0:
+            return
+        expires = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+layered_caches = []
+
+
+class LayeredCache(object):
+    """
+    In-process LRU cache in front of an optional shared Django cache.
+
+    Both layers are configured through settings: '<prefix>_SIZE' is the
+    number of entries kept in process (0 disables the cache),
+    '<prefix>_ALIAS' names an entry of CACHES used as the shared layer and
+    '<prefix>_TIMEOUT' is the lifetime of entries in seconds.
+    """
+    def __init__(self, prefix, default_size=1000, default_timeout=None):
+        self.prefix = prefix
+        self.default_size = default_size
+        self.default_timeout = default_timeout
+        self._local = None
+        layered_caches.append(self)
+
+    @property
+    def timeout(self):
+        return getattr(settings, self.prefix + '_TIMEOUT', self.default_timeout)
+
+    @property
+    def local(self):
+        if self._local is None:
+            self._local = LRUCache(getattr(settings, self.prefix + '_SIZE', self.default_size))
+        return self._local
+
+    @property
+    def shared(self):
+        alias = getattr(settings, self.prefix + '_ALIAS', None)
+        if alias is None:
+            return None
+        from django.core.cache import caches
+        return caches[alias]
+
+    @property
+    def enabled(self):
+        return getattr(settings, self.prefix + '_SIZE', self.default_size) > 0
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            shared = self.shared
+            if shared is not None:
+                value = shared.get(key)
+                if value is not None:
+                    self.local.set(key, value, self.timeout)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value, self.timeout)
+        shared = self.shared
+        if shared is not None:
+            shared.set(key, value, self.timeout)
+
+    def clear(self):
+        self._local = None
+
+
+def clear_layered_caches(setting, **kwargs):
+    for cache in layered_caches:
+        if setting.startswith(cache.prefix) or setting in ('CACHES', 'TEMPLATES'):
+            cache.clear()
+
+setting_changed.connect(clear_layered_caches)
+
+
+class ModelVersions(object):
+    """
+    Version number of every model's data. Cache keys of query results include
+    it, so bumping the version on post_save/post_delete invalidates all
+    results computed for a model at once. The receivers are connected for all
+    senders when the app is loaded, so processes that only write data (admin,
+    task workers) bump versions too.
+
+    Versions are kept in the cache named by FILTERS_VERSION_CACHE_ALIAS, which
+    must be shared between processes for invalidation to reach all of them;
+    without it they are kept in process. QuerySet.update() and bulk_create()
+    send no signals and do not invalidate anything.
+    """
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'FILTERS_VERSION_CACHE_ALIAS', None)
+        if alias is None:
+            return None
+        from django.core.cache import caches
+        return caches[alias]
+
+    def key(self, model):
+        return make_key('version', model._meta.db_table)
+
+    def get(self, model):
+        key = self.key(model)
+        shared = self.shared
+        if shared is None:
+            return self._local.setdefault(key, 1)
+        version = shared.get(key)
+        if version is None:
+            # start from the current time, so a lost version never brings
+            # back results cached under an old one
+            shared.add(key, int(time.time() * 1000), None)
+            version = shared.get(key)
+        return version
+
+    def bump(self, model):
+        key = self.key(model)
+        shared = self.shared
+        if shared is None:
+            with self._lock:
+                self._local[key] = self._local.get(key, 1) + 1
+            return
+        try:
+            shared.incr(key)
+        except ValueError:
+            shared.set(key, int(time.time() * 1000), None)
+
+    def model_changed(self, sender, **kwargs):
+        self.bump(sender)
+
+
+model_versions = ModelVersions()
+
+post_save.connect(model_versions.model_changed, weak=False, dispatch_uid='ww_filters.model_versions')
+post_delete.connect(model_versions.model_changed, weak=False, dispatch_uid='ww_filters.model_versions')
@@ -0,0 +1,118 @@
+# coding: utf-8
+"""
+Streaming export of filtered querysets as CSV or JSON Lines. Rows are read
+in chunks of FILTERS_EXPORT_CHUNK_SIZE through a server-side cursor on
+PostgreSQL and MySQL (a plain cursor elsewhere) and written to a
+StreamingHttpResponse as they arrive, so memory use does not depend on the
+number of exported rows.
+"""
+
+import csv
+import datetime
+import json
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.http import StreamingHttpResponse
+from django.utils import six
+from django.utils.encoding import force_text
+
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def chunk_size():
+    return getattr(settings, 'FILTERS_EXPORT_CHUNK_SIZE', 2000)
+
+
+def server_side_cursor(connection):
+    connection.ensure_connection()
+    if connection.vendor == 'postgresql':
+        # a named cursor keeps the result on the server, rows are fetched
+        # in chunks; it must live inside a transaction
+        return connection.connection.cursor(name='ww_filters_export_%s' % uuid.uuid4().hex)
+    if connection.vendor == 'mysql':
+        from MySQLdb.cursors import SSCursor
+        return connection.connection.cursor(SSCursor)
+    return connection.cursor()
+
+
+def fetch_chunks(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def export_rows(qs, columns, size=None):
+    """
+    Yields the `columns` of every row of qs as tuples, converted like
+    values_list() results.
+    """
+    qs = qs.values_list(*columns)
+    compiler = qs.query.get_compiler(using=qs.db)
+    try:
+        sql, params = compiler.as_sql()
+    except EmptyResultSet:
+        return
+    with transaction.atomic(using=qs.db):
+        cursor = server_side_cursor(connections[qs.db])
+        try:
+            cursor.execute(sql, params)
+            for row in compiler.results_iter(fetch_chunks(cursor, size or chunk_size())):
+                yield row
+        finally:
+            cursor.close()
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    value = force_text(value)
+    return value.encode('utf-8') if six.PY2 else value
+
+
+class Echo(object):
+    """File-like object returning what is written, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow([csv_value(h) for h in header])
+    for row in rows:
+        yield writer.writerow([csv_value(v) for v in row])
+
+
+def jsonl_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_response(filter_collection, columns, format='csv', filename=None, headers=None):
+    """
+    StreamingHttpResponse with the filtered rows of filter_collection in
+    `format` ('csv' or 'jsonl'). `headers` are the CSV column titles,
+    the column names by default.
+    """
+    rows = export_rows(filter_collection.update_qs(), columns)
+    if format == 'csv':
+        lines = csv_lines(rows, headers or columns)
+    elif format == 'jsonl':
+        lines = jsonl_lines(rows, columns)
+    else:
+        raise ValueError('Unknown export format %s' % format)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[format])
+    filename = filename or 'export'
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (filename, format)
+    return response
@@ -1,28 +1,227 @@
 # coding: utf-8
 
-import copy
-from django.utils import six
+import datetime
+import json
+import math
+import threading
+import time
+from array import array
+from decimal import Decimal
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, Count, Max, Min, Model, Q, Value, When
+from django.db.models.fields import FieldDoesNotExist, Field as ModelField
+from django.db.models.fields.related import ForeignObjectRel
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils import six, timezone, translation
+from django.utils.encoding import force_text
+from django.utils.translation import get_language, string_concat
 from collections import OrderedDict
 
-from . import filters
+from . import filters, updaters
+from .cache import LayeredCache, make_key, model_versions
+from .instrumentation import get_tracer, traced
+from .registry import registry
+
+
+#: results of FilterCollection.facets(), disabled unless FILTERS_FACET_CACHE_SIZE is set
+facet_cache = LayeredCache('FILTERS_FACET_CACHE', default_size=0, default_timeout=60)
+
+#: results of FilterCollection.count() and get_pks(), disabled unless FILTERS_RESULT_CACHE_SIZE is set
+result_cache = LayeredCache('FILTERS_RESULT_CACHE', default_size=0, default_timeout=300)
+
+#: results of FilterCollection.stats()
+stats_cache = LayeredCache('FILTERS_STATS_CACHE', default_size=1000, default_timeout=60)
+
+#: sorted pks of filter states for incremental refinement, disabled unless FILTERS_REFINE_CACHE_SIZE is set
+refine_cache = LayeredCache('FILTERS_REFINE_CACHE', default_size=0, default_timeout=300)
+
+#: refine_cache value of states with more than FILTERS_REFINE_MAX_PKS rows
+OVERSIZE = 'oversize'
+
+#: primary key types incremental refinement can store in a pk_array()
+INTEGER_PK_TYPES = ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField',
+                    'PositiveIntegerField', 'SmallIntegerField', 'PositiveSmallIntegerField')
 
 
 def get_declared_filters(bases, attrs, with_base_filters=True):
 
-    filters = [(filter_name, attrs.pop(filter_name))
-              for filter_name, obj in list(six.iteritems(attrs)) if isinstance(obj, filters.BaseFilter)]
-    filters.sort(key=lambda x: x[1].creation_counter)
+    declared = [(filter_name, attrs.pop(filter_name))
+                for filter_name, obj in list(six.iteritems(attrs)) if isinstance(obj, filters.BaseFilter)]
+    declared.sort(key=lambda x: x[1].creation_counter)
 
     if with_base_filters:
         for base in bases[::-1]:
             if hasattr(base, 'base_filters'):
-                filters = list(six.iteritems(base.base_filters)) + filters
+                declared = list(six.iteritems(base.base_filters)) + declared
     else:
         for base in bases[::-1]:
             if hasattr(base, 'declared_filters'):
-                filters = list(six.iteritems(base.declared_filters)) + filters
+                declared = list(six.iteritems(base.declared_filters)) + declared
+
+    return OrderedDict(declared)
+
+
+def planner_estimate(qs):
+    """
+    Row count of the queryset estimated by the query planner, or None if
+    the database backend gives no estimates.
+    """
+    connection = connections[qs.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = qs.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, six.string_types):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+_executor_pool = None
+_executor_lock = threading.Lock()
+
+
+def executor_pool():
+    """
+    Thread pool shared by FilterCollection.execute(), of
+    FILTERS_EXECUTOR_THREADS (4) threads.
+    """
+    global _executor_pool
+    with _executor_lock:
+        if _executor_pool is None:
+            _executor_pool = ThreadPool(getattr(settings, 'FILTERS_EXECUTOR_THREADS', 4))
+    return _executor_pool
+
+
+def run_task(func, frozen, qs, alias, language, tz, deadline, tracer, trace_state):
+    # tasks still queued when execute() gave up are dropped
+    if deadline is not None and time.time() >= deadline:
+        return None
+    # threads get their own connections: limit the statements of this one
+    # and close it afterwards, the pool threads outlive the request
+    frozen.qs = qs
+    if tracer is not None:
+        tracer.set_thread_state(trace_state)
+    try:
+        with translation.override(language), timezone.override(tz):
+            if deadline is not None and connections[alias].vendor == 'postgresql':
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SET statement_timeout = %s', [max(1, int((deadline - time.time()) * 1000))])
+            return func()
+    finally:
+        frozen.qs = None
+        if tracer is not None:
+            tracer.set_thread_state(None)
+        connections.close_all()
+
+
+def pk_array(pks):
+    """
+    Sorted array of integer primary keys, a fraction of the size of a list
+    in memory and pickled. None if the values do not fit.
+    """
+    try:
+        return array('l', sorted(pks))
+    except (OverflowError, TypeError):
+        return None
+
+
+def bucket_width(low, high, buckets):
+    """
+    Width of `buckets` equal buckets covering [low, high]: whole days for
+    dates, whole seconds for datetimes, whole numbers for integers.
+    """
+    if isinstance(low, datetime.datetime):
+        seconds = (high - low).total_seconds()
+        return datetime.timedelta(seconds=max(1, int(math.ceil(seconds / buckets))))
+    if isinstance(low, datetime.date):
+        return datetime.timedelta(days=max(1, int(math.ceil((high - low).days / float(buckets)))))
+    if isinstance(low, six.integer_types):
+        return max(1, int(math.ceil((high - low) / float(buckets))))
+    return (high - low) / buckets or 1
+
+
+def serialize_value(value):
+    """
+    JSON compatible form of a cleaned value that the filter forms accept back.
+    """
+    if isinstance(value, Model):
+        return value.pk
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [serialize_value(v) for v in value]
+    return value
+
+
+def payload_params(payload):
+    """
+    Request parameters of a payload built by BaseFilterCollection.clean_payload().
+    """
+    params = []
+    for name, conditions in six.iteritems(payload):
+        for uname, values in six.iteritems(conditions):
+            params.append(('_'.join([name, 'filter']), uname))
+            for field, value in sorted(six.iteritems(values)):
+                key = '%s_filter-%s' % (name, field)
+                if isinstance(value, list):
+                    params.extend((key, v) for v in value)
+                elif value is not None:
+                    params.append((key, value))
+    return params
+
+
+class FilterGroup(object):
+    """
+    Combines the conditions of several filters (or nested groups) with one
+    connector. Members that are not active in the current request are skipped.
+    """
+    def __init__(self, connector, *members):
+        self.connector = connector
+        self.members = members
+
+    def filter_names(self):
+        names = []
+        for member in self.members:
+            if isinstance(member, FilterGroup):
+                names.extend(member.filter_names())
+            else:
+                names.append(member)
+        return names
+
+    def get_q(self, conditions):
+        q = None
+        for member in self.members:
+            if isinstance(member, FilterGroup):
+                member_q = member.get_q(conditions)
+            else:
+                member_q = conditions.get(member)
+            if member_q is None:
+                continue
+            if q is None:
+                q = member_q
+            elif self.connector == Q.OR:
+                q = q | member_q
+            else:
+                q = q & member_q
+        return q
+
 
-    return OrderedDict(filters)
+def And(*members):
+    return FilterGroup(Q.AND, *members)
+
+
+def Or(*members):
+    return FilterGroup(Q.OR, *members)
 
 
 class DeclarativeFilterCollectionMetaclass(type):
@@ -33,24 +232,439 @@ class DeclarativeFilterCollectionMetaclass(type):
 
 
 class BaseFilterCollection(object):
-    filters = {}
+    """
+    base_filters is built once per class by the metaclass and is shared by
+    all instances; filters only holds BoundFilter objects with the state of
+    the current request.
+    """
+    base_filters = {}
+    filter_groups = ()
+    count_threshold = None
+    #: columns the export view may return, the model's own fields if None
+    export_columns = None
     qs = None
     initial = None
+    _conditions = None
 
     def __init__(self, qs, data=None, initial=None):
-        self.filters = copy.deepcopy(self.base_filters)
+        self.filters = OrderedDict((name, f.bind(name)) for name, f in six.iteritems(self.base_filters))
+        # queryset update_qs() returns to the tasks of execute(), per thread
+        self._frozen = threading.local()
         self.data = data
         self.qs = qs
         self.initial = initial
 
+    @classmethod
+    def clean_payload(cls, data):
+        """
+        Validates request parameters through the selected updaters only, with
+        no queryset involved. Returns the structured payload
+        {filter name: {updater name: cleaned values}} and the list of names of
+        invalid filters.
+        """
+        payload = OrderedDict()
+        errors = []
+        for name, filter_ in six.iteritems(cls.base_filters):
+            uname = data.get('_'.join([name, 'filter']))
+            if not uname:
+                continue
+            if uname not in filter_.updaters:
+                errors.append(name)
+                continue
+            form = filter_.updaters[uname].bind(filter_, name, data).form
+            if form.is_valid():
+                # submitted fields only, values computed by the form stay out
+                payload[name] = {uname: dict((k, serialize_value(v)) for k, v in six.iteritems(form.cleaned_data)
+                                             if k in form.fields)}
+            else:
+                errors.append(name)
+        return payload, errors
+
+    def get_conditions(self):
+        """
+        Q of every active filter, by filter name. Forms are validated once per
+        collection, every later call returns the same conditions.
+        """
+        if self._conditions is None:
+            self._conditions = self.compile_conditions()
+        return self._conditions
+
+    def compile_conditions(self):
+        conditions = OrderedDict()
+        for name, bound_filter in self.filters.items():
+            q = bound_filter.get_q(self.data, self.initial)
+            if q is not None:
+                conditions[name] = q
+        return conditions
+
+    def grouped_names(self):
+        names = set()
+        for group in self.filter_groups:
+            names.update(group.filter_names())
+        return names
+
+    def get_q(self, conditions=None):
+        """
+        Compiles the conditions of all active filters into one Q tree.
+        Filters listed in filter_groups are combined by their group, the rest
+        are AND'ed together.
+        """
+        if conditions is None:
+            conditions = self.get_conditions()
+
+        q = Q()
+        grouped = self.grouped_names()
+        for group in self.filter_groups:
+            group_q = group.get_q(conditions)
+            if group_q is not None:
+                q &= group_q
+        for name, condition in conditions.items():
+            if name not in grouped:
+                q &= condition
+        return q
+
     def update_qs(self):
+        frozen = getattr(self._frozen, 'qs', None)
+        if frozen is not None:
+            return frozen
         if self.data is None and self.initial is None:
             return self.qs
-        qs = self.qs
-        for filter_name in self.filters:
-            qs = self.filters[filter_name].update_qs(qs, filter_name, self.data, self.initial)
+        conditions = self.get_conditions()
+        if refine_cache.enabled and self.qs.model._meta.pk.get_internal_type() in INTEGER_PK_TYPES:
+            qs = self.refined_qs(conditions)
+        else:
+            q = self.get_q(conditions)
+            qs = self.qs.filter(q) if q else self.qs
+        tracer = get_tracer()
+        if tracer is not None:
+            qs = traced(qs, tracer)
         return qs
 
+    def refined_qs(self, conditions):
+        """
+        Incremental refinement: the sorted pks of filter states are kept in
+        refine_cache, so a state adding one AND'ed condition to a cached state
+        only evaluates that condition on the cached pks. Single condition
+        states are cached as the starting points; other states, such as those
+        removing or relaxing a condition with no cached parent, are evaluated
+        in full and not cached. Members of filter_groups may widen the result
+        and are never refined.
+
+        Returns the filtered queryset as pk IN the refined set, or the plain
+        filtered queryset for states of more than FILTERS_REFINE_MAX_PKS rows,
+        which are remembered as such.
+        """
+        q = self.get_q(conditions)
+        if not conditions:
+            return self.qs.filter(q) if q else self.qs
+        key = make_key('refine', self.state_key())
+        pks = refine_cache.get(key)
+        if pks is None:
+            qs = None
+            grouped = self.grouped_names()
+            for name, condition in conditions.items():
+                if name in grouped or len(conditions) == 1:
+                    continue
+                parent = refine_cache.get(make_key('refine', self.state_key(exclude=(name,))))
+                if isinstance(parent, array):
+                    qs = self.qs.filter(pk__inlist=parent).filter(condition) if parent else self.qs.none()
+                    break
+            if qs is None:
+                if len(conditions) > 1:
+                    return self.qs.filter(q)
+                qs = self.qs.filter(q)
+            limit = getattr(settings, 'FILTERS_REFINE_MAX_PKS', 100000)
+            pks = list(qs.order_by().values_list('pk', flat=True)[:limit + 1])
+            pks = pk_array(pks) if len(pks) <= limit else None
+            refine_cache.set(key, OVERSIZE if pks is None else pks)
+        if not isinstance(pks, array):
+            return self.qs.filter(q)
+        return self.qs.filter(pk__inlist=pks) if pks else self.qs.none()
+
+    def get_state(self, exclude=()):
+        """
+        Canonical, order independent description of the applied filters,
+        but the `exclude`d ones. Only valid after update_qs().
+        """
+        states = (f.get_state() for name, f in self.filters.items() if name not in exclude)
+        return tuple(sorted(state for state in states if state is not None))
+
+    def state_key(self, versioned=True, exclude=()):
+        """
+        Cache key of the filtered queryset: collection class, base queryset,
+        the canonical filter state and, if `versioned`, the versions of the
+        data of data_models(). With `exclude`, the key of the state without
+        those filters.
+        """
+        try:
+            base = str(self.qs.query)
+        except EmptyResultSet:
+            base = 'empty'
+        version = [model_versions.get(model) for model in self.data_models(exclude)] if versioned else None
+        return make_key(type(self).__module__, type(self).__name__, self.qs.model._meta.db_table, base,
+                        self.get_state(exclude), version)
+
+    def execute(self, tasks, timeout=None):
+        """
+        Runs independent read-only tasks, {name: callable with no arguments}
+        such as this collection's count, facets or stats, concurrently in the
+        executor_pool() and returns {name: result}. The filtered queryset is
+        built once beforehand; update_qs() returns every task its own copy.
+
+        Every task runs on its own database connection, closed when it ends.
+        `timeout` (FILTERS_EXECUTOR_TIMEOUT, none by default) in seconds
+        bounds the wait for all results, raising multiprocessing.TimeoutError;
+        tasks not started by then are dropped and on PostgreSQL statements
+        are cancelled past it. Tasks run one after another inside atomic
+        blocks, whose uncommitted data other connections do not see, and on
+        in-memory SQLite databases, which are not shared between connections.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'FILTERS_EXECUTOR_TIMEOUT', None)
+        qs = self.update_qs()
+        connection = connections[qs.db]
+        sequential = len(tasks) < 2 or connection.in_atomic_block or \
+            getattr(settings, 'FILTERS_EXECUTOR_THREADS', 4) < 2 or \
+            (connection.vendor == 'sqlite' and connection.is_in_memory_db(connection.settings_dict['NAME']))
+
+        if sequential:
+            self._frozen.qs = qs
+            try:
+                return OrderedDict((name, func()) for name, func in six.iteritems(tasks))
+            finally:
+                self._frozen.qs = None
+
+        pool = executor_pool()
+        deadline = time.time() + timeout if timeout else None
+        language, tz = get_language(), timezone.get_current_timezone()
+        tracer = get_tracer()
+        trace_state = tracer.thread_state() if tracer is not None else None
+        pending = [(name, pool.apply_async(run_task, (func, self._frozen, qs.all(), qs.db, language, tz, deadline,
+                                                      tracer, trace_state)))
+                   for name, func in six.iteritems(tasks)]
+        results = OrderedDict()
+        for name, pending_result in pending:
+            if deadline is None:
+                results[name] = pending_result.get()
+            else:
+                results[name] = pending_result.get(max(0, deadline - time.time()))
+        return results
+
+    def is_multi_valued(self, name):
+        """
+        Whether filter `name` is on a path through a multi-valued relation,
+        whose join repeats rows of the filtered queryset.
+        """
+        return False
+
+    def data_models(self, exclude=()):
+        """
+        Models whose data the filtered queryset, without the `exclude`d
+        filters, depends on. Only valid after update_qs().
+        """
+        return [self.qs.model]
+
+    def count(self):
+        qs = self.update_qs()
+        if not result_cache.enabled:
+            return qs.count()
+        key = make_key('count', self.state_key())
+        count = result_cache.get(key)
+        if count is None:
+            count = qs.count()
+            result_cache.set(key, count)
+        return count
+
+    def bounded_count(self, threshold=None):
+        """
+        Counts at most `threshold` (count_threshold by default) rows, with a
+        LIMIT threshold + 1 subquery. Returns (count, exact): beyond the
+        threshold count is the planner estimate where the backend has one and
+        the threshold otherwise, meaning "more than count".
+        """
+        threshold = threshold if threshold is not None else self.count_threshold
+        if threshold is None:
+            return self.count(), True
+        qs = self.update_qs().order_by()
+
+        key = None
+        if result_cache.enabled:
+            key = make_key('bounded_count', self.state_key(), threshold)
+            result = result_cache.get(key)
+            if result is not None:
+                return result
+
+        count = qs[:threshold + 1].count()
+        if count <= threshold:
+            result = count, True
+        else:
+            estimate = planner_estimate(qs)
+            result = max(estimate, threshold) if estimate is not None else threshold, False
+
+        if key is not None:
+            result_cache.set(key, result)
+        return result
+
+    def ranked(self):
+        """
+        Filtered queryset ordered by relevance for the first applied
+        full-text filter.
+        """
+        qs = self.update_qs()
+        for name, bound_filter in self.filters.items():
+            updater = bound_filter.bound_updater
+            if isinstance(bound_filter.filter, filters.FullTextFilter) and updater is not None and \
+                    isinstance(updater.updater, updaters.FullText) and updater.form.is_valid():
+                return bound_filter.filter.rank(qs, name, updater.form.cleaned_data['value'])
+        return qs
+
+    def get_pks(self):
+        """
+        Primary keys of the filtered queryset in its order. Lists longer than
+        FILTERS_RESULT_CACHE_MAX_PKS are not cached.
+        """
+        qs = self.update_qs()
+        if not result_cache.enabled:
+            return list(qs.values_list('pk', flat=True))
+        key = make_key('pks', self.state_key())
+        pks = result_cache.get(key)
+        if pks is None:
+            pks = list(qs.values_list('pk', flat=True))
+            if len(pks) <= getattr(settings, 'FILTERS_RESULT_CACHE_MAX_PKS', 10000):
+                result_cache.set(key, pks)
+        return pks
+
+    def facets(self, names=None, limit=10):
+        """
+        Number of rows of the filtered queryset for every value of the given
+        facet filters (choice, boolean and model choice filters by default),
+        the `limit` largest per filter. Filters with known values are counted
+        together in one conditional aggregation query, model choice filters
+        with one grouped query each. Rows are counted once however many
+        related rows of a multi-valued path match.
+
+        Returns {filter name: [(value, label, count), ...]}.
+        """
+        if names is None:
+            names = [name for name, f in six.iteritems(self.base_filters) if f.facet]
+        qs = self.update_qs()
+
+        key = None
+        if facet_cache.enabled:
+            key = make_key('facets', self.state_key(), tuple(names), limit, get_language())
+            result = facet_cache.get(key)
+            if result is not None:
+                return result
+
+        aggregates = {}
+        choices = {}
+        for i, name in enumerate(names):
+            choices[name] = self.base_filters[name].facet_choices()
+        # the join of any multi-valued path repeats rows for all facets
+        distinct = any(self.is_multi_valued(name) for name in names if choices[name] is not None)
+        for i, name in enumerate(names):
+            for j, (value, label) in enumerate(choices[name] or ()):
+                aggregates['facet_%d_%d' % (i, j)] = Count(Case(When(then='pk', **{name: value})),
+                                                           distinct=distinct)
+        counts = qs.order_by().aggregate(**aggregates) if aggregates else {}
+
+        result = OrderedDict()
+        for i, name in enumerate(names):
+            if choices[name] is not None:
+                values = [(value, force_text(label), counts['facet_%d_%d' % (i, j)])
+                          for j, (value, label) in enumerate(choices[name])]
+                values.sort(key=lambda x: -x[2])
+                result[name] = [v for v in values if v[2]][:limit]
+            else:
+                count = Count('pk', distinct=self.is_multi_valued(name))
+                rows = list(qs.order_by().values_list(name).annotate(count=count).order_by('-count')[:limit])
+                labels = self.base_filters[name].facet_labels([value for value, count in rows])
+                result[name] = [(value, labels.get(value, ''), count) for value, count in rows]
+
+        if key is not None:
+            facet_cache.set(key, result)
+        return result
+
+    def stats(self, names=None, buckets=10):
+        """
+        Value range of the filtered queryset and its histogram in `buckets`
+        equal-width buckets for the given filters (integer, date and datetime
+        filters by default). Ranges of all fields are read with one aggregate
+        query and all histograms are counted with one conditional
+        aggregation query; fields of multi-valued paths get their own two
+        queries, where buckets count the rows with any related value in them.
+        Results are cached by filter state.
+
+        Returns {filter name: {'min': v, 'max': v, 'buckets': [(start, end, count), ...]}};
+        bucket ends are exclusive except for the last one.
+        """
+        if names is None:
+            names = [name for name, f in six.iteritems(self.base_filters) if f.stats]
+        qs = self.update_qs()
+
+        key = None
+        if stats_cache.enabled:
+            key = make_key('stats', self.state_key(), tuple(names), buckets)
+            result = stats_cache.get(key)
+            if result is not None:
+                return result
+
+        ranges, edges, counts = {}, {}, {}
+        single = [(i, name) for i, name in enumerate(names) if not self.is_multi_valued(name)]
+        many = [(i, name) for i, name in enumerate(names) if self.is_multi_valued(name)]
+        if single:
+            self.aggregate_stats(qs.order_by(), single, buckets, ranges, edges, counts)
+        if many:
+            # their joins repeat rows, which must not reach the other fields
+            rows = self.qs.model._base_manager.filter(pk__in=qs.values('pk'))
+            self.aggregate_stats(rows, many, buckets, ranges, edges, counts, distinct=True)
+
+        result = OrderedDict()
+        for i, name in enumerate(names):
+            result[name] = {
+                'min': ranges['min_%d' % i],
+                'max': ranges['max_%d' % i],
+                'buckets': [(start, end, counts['bucket_%d_%d' % (i, j)])
+                            for j, (start, end) in enumerate(edges.get(name, ()))],
+            }
+
+        if key is not None:
+            stats_cache.set(key, result)
+        return result
+
+    def aggregate_stats(self, qs, names, buckets, ranges, edges, counts, distinct=False):
+        """
+        Ranges and bucket counts of the (index, name) `names` of stats(), read
+        from qs with two aggregate queries into `ranges`, `edges` and `counts`.
+        """
+        aggregates = {}
+        for i, name in names:
+            aggregates['min_%d' % i] = Min(name)
+            aggregates['max_%d' % i] = Max(name)
+        ranges.update(qs.aggregate(**aggregates))
+
+        aggregates = {}
+        for i, name in names:
+            low, high = ranges['min_%d' % i], ranges['max_%d' % i]
+            if low is None:
+                continue
+            width = bucket_width(low, high, buckets)
+            edges[name] = []
+            for j in range(buckets):
+                start = low + width * j
+                if start > high:
+                    break
+                last = j == buckets - 1 or start + width > high
+                end = high if last else start + width
+                edges[name].append((start, end))
+                condition = {'__'.join([name, 'gte']): start, '__'.join([name, 'lte' if last else 'lt']): end}
+                if distinct:
+                    aggregates['bucket_%d_%d' % (i, j)] = Count(Case(When(then='pk', **condition)), distinct=True)
+                else:
+                    aggregates['bucket_%d_%d' % (i, j)] = Count(Case(When(then=Value(1), **condition)))
+        if aggregates:
+            counts.update(qs.aggregate(**aggregates))
+
 
 class FilterCollection(six.with_metaclass(DeclarativeFilterCollectionMetaclass, BaseFilterCollection)):
     pass
@@ -63,97 +677,197 @@ class ModelFilterCollectionOptions(object):
         self.exclude = getattr(options, 'exclude', None)
         self.titles = getattr(options, 'titles', None)
         self.select2 = getattr(options, 'select2', None)
+        self.autocomplete = getattr(options, 'autocomplete', None)
+        self.fulltext = getattr(options, 'fulltext', None)
+
+
+def lookup_path(model, path):
+    """
+    Resolves a `__` separated field path of model. Returns the target field
+    and the relations leading to it (forward fields or reverse relation
+    objects).
+    """
+    relations = []
+    parts = path.split('__')
+    for part in parts[:-1]:
+        relation = model._meta.get_field(part)
+        if not relation.is_relation:
+            raise FieldDoesNotExist('%s has no relation %s' % (model._meta.object_name, part))
+        relations.append(relation)
+        model = relation.related_model
+    return model._meta.get_field(parts[-1]), relations
+
+
+def filter_joins(model, name):
+    """
+    Relations joined by filtering on `name`: list of (lookup path, attribute
+    path, related model, multi-valued) tuples, empty for the model's own
+    fields and for names that are not field paths. Attribute paths name
+    reverse relations by their accessor, as prefetch_related() expects.
+    """
+    if '__' not in name:
+        return []
+    try:
+        field, relations = lookup_path(model, name)
+    except FieldDoesNotExist:
+        return []
+    joins = []
+    parts, attrs = name.split('__'), []
+    for i, relation in enumerate(relations):
+        attrs.append(relation.get_accessor_name() if isinstance(relation, ForeignObjectRel) else relation.name)
+        joins.append(('__'.join(parts[:i + 1]), '__'.join(attrs), relation.related_model,
+                      relation.many_to_many or relation.one_to_many))
+    return joins
+
+
+def relation_title(relation):
+    if isinstance(relation, ForeignObjectRel):
+        return relation.related_model._meta.verbose_name_plural
+    return relation.verbose_name
+
+
+def model_filters(opts, declared_filters):
+    filter_fields = OrderedDict()
+
+    def add_filter(name, field, default_title):
+        if opts.titles is not None and name in opts.titles:
+            title = opts.titles[name]
+        else:
+            title = default_title
+        select2 = opts.select2 is not None and name in opts.select2
+        filter_ = registry.filter_for_field(field, name, title, select2, opts)
+        if filter_ is not None:
+            filter_fields[name] = filter_
+
+    sortable_virtual_fields = [f for f in opts.model._meta.virtual_fields if isinstance(f, ModelField)]
+    for f in sorted(list(opts.model._meta.concrete_fields) + sortable_virtual_fields):
+        if opts.fields is not None and not f.name in opts.fields:
+            continue
+        if opts.exclude and f.name in opts.exclude:
+            continue
+        add_filter(f.name, f, f.verbose_name)
+
+    # fields of related models, named by their lookup path
+    for name in opts.fields or ():
+        if '__' not in name or name in declared_filters:
+            continue
+        field, relations = lookup_path(opts.model, name)
+        title_parts = []
+        for relation in relations:
+            title_parts.extend([relation_title(relation), ': '])
+        add_filter(name, field, string_concat(*(title_parts + [field.verbose_name])))
+
+    filter_fields.update(declared_filters)
+
+    if opts.fields is not None:
+        sorted_filter_fields = OrderedDict()
+        for field in opts.fields:
+            sorted_filter_fields[field] = filter_fields.pop(field)
+        sorted_filter_fields.update(filter_fields)
+        return sorted_filter_fields
+    return filter_fields
+
+
+class LazyBaseFilters(object):
+    """
+    base_filters of model filter collections, built from the model fields
+    when first accessed (usually by the first instantiation) instead of at
+    import time.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def __get__(self, instance, owner):
+        base_filters = owner.__dict__.get('_base_filters')
+        if base_filters is None:
+            with self.lock:
+                base_filters = owner.__dict__.get('_base_filters')
+                if base_filters is None:
+                    if owner._meta.model:
+                        base_filters = model_filters(owner._meta, owner.declared_filters)
+                        owner._filter_joins = dict((name, filter_joins(owner._meta.model, name))
+                                                   for name in base_filters)
+                    else:
+                        base_filters = owner.declared_filters
+                        owner._filter_joins = {}
+                    owner._base_filters = base_filters
+        return base_filters
 
 
 class ModelFilterCollectionMetaclass(type):
     def __new__(cls, name, bases, attrs):
+        attrs['declared_filters'] = get_declared_filters(bases, attrs, False)
+        attrs['base_filters'] = LazyBaseFilters()
         new_class = super(ModelFilterCollectionMetaclass, cls).__new__(cls, name, bases, attrs)
-        declared_fields = get_declared_filters(bases, attrs, False)
-
-        opts = new_class._meta = ModelFilterCollectionOptions(getattr(new_class, 'Meta', None))
-        fields = opts.fields
-        exclude = opts.exclude
-        filter_fields = OrderedDict()
-
-        if opts.model:
-            from django.db.models.fields import Field as ModelField, related
-            from django.db.models import fields as fields_
-            sortable_virtual_fields = [f for f in opts.model._meta.virtual_fields if isinstance(f, ModelField)]
-            for f in sorted(list(opts.model._meta.concrete_fields) + sortable_virtual_fields):
-                if fields is not None and not f.name in fields:
-                    continue
-                if exclude and f.name in exclude:
-                    continue
-                if opts.titles is not None and f.name in opts.titles:
-                    title = opts.titles[f.name]
-                else:
-                    title = f.verbose_name
-                if opts.select2 is not None and f.name in opts.select2:
-                    select2 = True
-                else:
-                    select2 = False
-
-                if isinstance(f, (related.ForeignKey, )):
-                    if f.blank:
-                        filter_fields[f.name] = filters.ModelChoiceFilterWithEmpty(
-                            title=title, select2=select2, queryset=f.rel.to._default_manager.all())
-                    else:
-                        filter_fields[f.name] = filters.BaseModelChoiceFilter(
-                            title=title, select2=select2, queryset=f.rel.to._default_manager.all())
-
-                elif f.choices:
-                    if f.blank:
-                        filter_fields[f.name] = filters.ChoiceFilterWithEmpty(title=title, choices=f.choices,
-                                                                              select2=select2)
-                    else:
-                        filter_fields[f.name] = filters.BaseChoiceFilter(title=title, choices=f.choices, select2=select2)
-
-                elif isinstance(f, (fields_.CharField, fields_.TextField)):
-                    if f.blank:
-                        filter_fields[f.name] = filters.StringFilterWithEmpty(title=title)
-                    else:
-                        filter_fields[f.name] = filters.BaseStringFilter(title=title)
-
-                elif isinstance(f, (fields_.IntegerField, fields_.DecimalField, fields_.FloatField)):
-                    if f.blank:
-                        filter_fields[f.name] = filters.IntegerFilterWithEmpty(title=title)
-                    else:
-                        filter_fields[f.name] = filters.BaseIntegerFilter(title=title)
-
-                elif isinstance(f, fields_.DateTimeField):
-                    if f.blank:
-                        filter_fields[f.name] = filters.DateTimeFilterWithEmpty(title=title)
-                    else:
-                        filter_fields[f.name] = filters.BaseDateTimeFilter(title=title)
-
-                elif isinstance(f, fields_.DateField):
-                    if f.blank:
-                        filter_fields[f.name] = filters.DateFilterWithEmpty(title=title)
-                    else:
-                        filter_fields[f.name] = filters.BaseDateFilter(title=title)
-
-                elif isinstance(f, fields_.BooleanField):
-                    filter_fields[f.name] = filters.BooleanFilter(title=title)
-
-            filter_fields.update(declared_fields)
-
-            if fields is not None:
-                sorted_filter_fields = OrderedDict()
-                for field in fields:
-                    sorted_filter_fields[field] = filter_fields.pop(field)
-                sorted_filter_fields.update(filter_fields)
-                new_class.base_filters = sorted_filter_fields
-            else:
-                new_class.base_filters = filter_fields
-        else:
-            new_class.base_filters = declared_fields
+        new_class._meta = ModelFilterCollectionOptions(getattr(new_class, 'Meta', None))
         return new_class
 
 
 class BaseModelFilterCollection(BaseFilterCollection):
+    """
+    Filters on fields of related models (`Meta.fields` paths like
+    'customer__city') join the related tables. Conditions through
+    multi-valued relations are applied as pk IN subqueries, so the filtered
+    queryset has no duplicate rows, and every such filter matches on its own
+    (any related row satisfying it). update_qs() selects the related objects
+    of single-valued joins and prefetches those of multi-valued ones.
+    """
+    _filter_joins = {}
+
     def __init__(self, qs, data=None, initial=None):
         super(BaseModelFilterCollection, self).__init__(qs, data, initial)
 
+    def compile_conditions(self):
+        conditions = super(BaseModelFilterCollection, self).compile_conditions()
+        for name, q in conditions.items():
+            if self.is_multi_valued(name):
+                conditions[name] = Q(pk__in=self.qs.model._base_manager.filter(q).values('pk'))
+        return conditions
+
+    def is_multi_valued(self, name):
+        return any(many for path, attr, model, many in self._filter_joins.get(name, ()))
+
+    def active_joins(self, exclude=()):
+        joins = OrderedDict()
+        for name, bound_filter in self.filters.items():
+            if name not in exclude and bound_filter.get_state() is not None:
+                for path, attr, model, many in self._filter_joins.get(name, ()):
+                    joins[path] = attr, model, many
+        return joins
+
+    def joins(self):
+        """
+        Relations joined by the applied filters: {lookup path: multi-valued}.
+        Only valid after update_qs().
+        """
+        return OrderedDict((path, many) for path, (attr, model, many) in self.active_joins().items())
+
+    def data_models(self, exclude=()):
+        models = super(BaseModelFilterCollection, self).data_models(exclude)
+        for attr, model, many in self.active_joins(exclude).values():
+            if model not in models:
+                models.append(model)
+        return models
+
+    def update_qs(self):
+        qs = super(BaseModelFilterCollection, self).update_qs()
+        if qs is getattr(self._frozen, 'qs', None):
+            return qs
+        joins = self.active_joins()
+        select, prefetch = [], []
+        for path, (attr, model, many) in joins.items():
+            if any(other.startswith(path + '__') for other in joins):
+                continue  # covered by a longer path
+            if any(joins[other][2] for other in joins if path == other or path.startswith(other + '__')):
+                prefetch.append(attr)
+            else:
+                select.append(path)
+        if select:
+            qs = qs.select_related(*select)
+        if prefetch:
+            qs = qs.prefetch_related(*prefetch)
+        return qs
+
 
 class ModelFilterCollection(six.with_metaclass(ModelFilterCollectionMetaclass, BaseModelFilterCollection)):
     pass
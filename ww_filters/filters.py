@@ -1,11 +1,16 @@
 # coding: utf-8
-
-import copy
+import time
+from django import forms
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models import Model
 from django.utils import six
+from django.utils.encoding import force_text
 from django.utils.translation import ugettext_lazy as _
 from collections import OrderedDict
 
-from . import updaters
+from . import fulltext, updaters
+from .instrumentation import get_tracer
 
 
 def get_declared_subfilters(bases, attrs, with_base_fields=True):
@@ -49,34 +54,144 @@ class DeclarativeSubFiltersMetaclass(type):
         return new_class
 
 
+def canonical_value(value):
+    if isinstance(value, Model):
+        return value.pk
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(canonical_value(v) for v in value))
+    return value
+
+
+class BoundFilter(object):
+    """
+    Per-request state of a filter inside a filter collection: bound updaters,
+    the name of the selected updater and the validation error flag.
+
+    Only the selected updater takes part in filtering; unbound updaters (and
+    their forms) are created when something, usually a template, accesses
+    them through `updaters`.
+    """
+    __slots__ = ('filter', 'name', 'bound', 'error', 'updater_name', '_updaters', '_bound_updater')
+
+    def __init__(self, filter_, name):
+        self.filter = filter_
+        self.name = name
+        self.bound = None
+        self.error = False
+        self.updater_name = None
+        self._updaters = None
+        self._bound_updater = None
+
+    @property
+    def title(self):
+        return self.filter.title
+
+    @property
+    def bound_updater(self):
+        return self._bound_updater
+
+    @property
+    def updaters(self):
+        if self._updaters is None:
+            bound_updater = self._bound_updater
+            self._updaters = OrderedDict()
+            for uname, u in self.filter.updaters.items():
+                if bound_updater is not None and bound_updater.updater is u:
+                    self._updaters[uname] = bound_updater
+                else:
+                    self._updaters[uname] = u.bind(self.filter, self.name)
+        return self._updaters
+
+    def bind_updater(self, uname, data):
+        updater = self._bound_updater = self.filter.updaters[uname].bind(self.filter, self.name, data)
+        self.updater_name = uname
+        if self._updaters is not None:
+            self._updaters[uname] = updater
+        return updater
+
+    def get_state(self):
+        """
+        Hashable description of the applied condition: updater name and its
+        cleaned data. None if the filter is not applied.
+        """
+        updater = self._bound_updater
+        if updater is None or not updater.form.is_valid():
+            return None
+        data = tuple(sorted((key, canonical_value(value)) for key, value in updater.form.cleaned_data.items()))
+        return self.name, self.updater_name, data
+
+    def get_q(self, data=None, initial=None):
+        initial = initial if initial is not None else {}
+        if data is not None:
+            data_name = '_'.join([self.name, 'filter'])
+            if data.get(data_name):
+                self.bound = data.get(data_name)
+                updater = self.bind_updater(self.bound, data)
+                q = self.evaluate(updater)
+                if updater.error:
+                    self.error = True
+                return q
+            elif data_name in initial:
+                return self.evaluate(self.bind_updater(initial.get(data_name), initial))
+        return None
+
+    def evaluate(self, updater):
+        tracer = get_tracer()
+        if tracer is None:
+            return updater.get_q()
+        start = time.time()
+        q = updater.get_q()
+        tracer.filter_evaluated(self, updater, q, time.time() - start)
+        return q
+
+    def update_qs(self, qs, data=None, initial=None):
+        q = self.get_q(data, initial)
+        if q is not None:
+            qs = qs.filter(q)
+        return qs
+
+
 class BaseFilter(object):
+    """
+    Filter definition. Instances are created once, when the filter collection
+    class is declared, and are shared by all requests; per-request state lives
+    in BoundFilter.
+    """
     creation_counter = 0
-    bound = None
-    error = False
     title = None
+    facet = False
+    #: FilterCollection.stats() computes the value range of the field
+    stats = False
 
     def __init__(self, title):
         self.title = title
-        self.updaters = copy.deepcopy(self.base_fields)
+        self.updaters = self.base_fields
         self.creation_counter = Filter.creation_counter
         Filter.creation_counter += 1
 
+    def bind(self, name):
+        return BoundFilter(self, name)
+
+    def to_python(self, value):
+        """
+        Converts one item of a pasted value list, raising ValidationError if
+        it is not valid for the field.
+        """
+        return value
+
     def update_qs(self, qs, name, data=None, initial=None):
-        for uname, u in self.updaters.items():
-            qs = u.proceed(name, None, qs)
-        initial = initial if initial is not None else {}
-        if data is not None:
-            data_name = '_'.join([name, 'filter'])
-            if data_name in data:
-                self.bound = data.get(data_name)
-                updater = self.updaters[data.get(data_name)]
-                qs = updater.proceed(name, data, qs)
-                if updater.error:
-                    self.error = True
-            elif data_name in initial:
-                updater = self.updaters[initial.get(data_name)]
-                qs = updater.proceed(name, initial, qs)
-        return qs
+        return self.bind(name).update_qs(qs, data, initial)
+
+    def facet_choices(self):
+        """
+        (value, label) pairs counted by FilterCollection.facets() with
+        conditional aggregation, or None if the values are not known in
+        advance and have to be grouped in the database.
+        """
+        return None
+
+    def facet_labels(self, values):
+        return dict((value, force_text(value)) for value in values)
 
 
 class Filter(six.with_metaclass(DeclarativeSubFiltersMetaclass, BaseFilter)):
@@ -88,6 +203,7 @@ class BaseStringFilter(Filter):
     starts_with = updaters.StartsWith(_('Starts with'))
     ends_with = updaters.EndsWith(_('Ends with'))
     contains = updaters.Contains(_('Contains'))
+    in_list = updaters.In(_('In list'))
 
 
 class StringFilterWithEmpty(BaseStringFilter):
@@ -100,10 +216,30 @@ class StringFilterWithEmptyForIntegerField(BaseStringFilter):
     not_empty = updaters.NotEmpty(_('Filled'))
 
 
+class FullTextFilter(Filter):
+    search = updaters.FullText(_('Contains words'))
+    equal = updaters.CharEqual(_('Equal'))
+    starts_with = updaters.StartsWith(_('Starts with'))
+
+    def rank(self, qs, name, query):
+        return fulltext.rank(qs, name, query)
+
+
+class FullTextFilterWithEmpty(FullTextFilter):
+    empty = updaters.Empty(_('Empty'))
+    not_empty = updaters.NotNull(_('Filled'))
+
+
 class BaseIntegerFilter(Filter):
+    stats = True
+
     equal = updaters.IntegerEqual(_('Equal'))
     greater_than = updaters.GreaterThan(_('Greater than'))
     less_than = updaters.LessThan(_('Less than'))
+    in_list = updaters.In(_('In list'))
+
+    def to_python(self, value):
+        return forms.IntegerField().clean(value)
 
 
 class IntegerFilterWithEmpty(BaseIntegerFilter):
@@ -112,9 +248,15 @@ class IntegerFilterWithEmpty(BaseIntegerFilter):
 
 
 class BaseDateFilter(Filter):
+    stats = True
+
     today = updaters.DateToday(_('Today'))
     equal = updaters.DateEqual(_('Equal'))
     range = updaters.DateRange(_('Between'))
+    last_days = updaters.LastDays(_('Last days'))
+    this_week = updaters.ThisWeek(_('This week'))
+    this_month = updaters.ThisMonth(_('This month'))
+    this_quarter = updaters.ThisQuarter(_('This quarter'))
 
 
 class DateFilterWithEmpty(BaseDateFilter):
@@ -123,9 +265,15 @@ class DateFilterWithEmpty(BaseDateFilter):
 
 
 class BaseDateTimeFilter(Filter):
+    stats = True
+
     today = updaters.DateTimeToday(_('Today'))
     equal = updaters.DateTimeEqual(_('Equal'))
     range = updaters.DateTimeRange(_('Between'))
+    last_days = updaters.DateTimeLastDays(_('Last days'))
+    this_week = updaters.DateTimeThisWeek(_('This week'))
+    this_month = updaters.DateTimeThisMonth(_('This month'))
+    this_quarter = updaters.DateTimeThisQuarter(_('This quarter'))
 
 
 class DateTimeFilterWithEmpty(BaseDateTimeFilter):
@@ -136,19 +284,32 @@ class DateTimeFilterWithEmpty(BaseDateTimeFilter):
 class BooleanFilter(Filter):
     true = updaters.TrueBoolean(_('Checked'))
     false = updaters.FalseBoolean(_('Not checked'))
+    facet = True
+
+    def facet_choices(self):
+        return [(True, self.updaters['true'].title), (False, self.updaters['false'].title)]
 
 
 class BaseChoiceFilter(Filter):
     choice_equal = updaters.Choice(_('Equal'))
     choices = None
+    select2 = False
+
+    facet = True
 
     def __init__(self, title, choices, select2=False):
         super(BaseChoiceFilter, self).__init__(title)
         self.choices = choices
-        for name, u in self.updaters.items():
-            if isinstance(u, updaters.ChoiceIn) or isinstance(u, updaters.Choice):
-                u.queryset = self.choices
-                u.select2 = select2
+        self.select2 = select2
+
+    def facet_choices(self):
+        flat = []
+        for value, label in self.choices:
+            if isinstance(label, (list, tuple)):
+                flat.extend(label)
+            else:
+                flat.append((value, label))
+        return flat
 
 
 class ChoiceFilterWithEmpty(BaseChoiceFilter):
@@ -158,16 +319,69 @@ class ChoiceFilterWithEmpty(BaseChoiceFilter):
 
 class BaseModelChoiceFilter(Filter):
     choice_equal = updaters.ModelChoice(_('Equal'))
+    in_list = updaters.ModelIn(_('In list'))
     queryset = None
+    select2 = False
+    autocomplete = False
+    label_field = None
 
-    def __init__(self, title, queryset, select2=False):
+    def __init__(self, title, queryset, select2=False, autocomplete=False, label_field=None):
         super(BaseModelChoiceFilter, self).__init__(title)
         self.queryset = queryset
-
-        for name, u in self.updaters.items():
-            if isinstance(u, updaters.ModelChoice):
-                u.queryset = self.queryset
-                u.select2 = select2
+        self.select2 = select2 or autocomplete
+        self.autocomplete = autocomplete
+        self.label_field = label_field
+
+    facet = True
+
+    def facet_labels(self, values):
+        values = [v for v in values if v is not None]
+        if self.label_field is not None:
+            rows = self.queryset.filter(pk__in=values).values_list('pk', self.label_field)
+            return dict((pk, force_text(label)) for pk, label in rows)
+        return dict((obj.pk, force_text(obj)) for obj in self.queryset.filter(pk__in=values))
+
+    def to_python(self, value):
+        return self.queryset.model._meta.pk.to_python(value)
+
+    def label_from_instance(self, obj):
+        if self.label_field is not None:
+            return force_text(getattr(obj, self.label_field))
+        return force_text(obj)
+
+    @property
+    def search_field(self):
+        """
+        Field the autocomplete term is matched against: label_field, else the
+        first text field of the model.
+        """
+        if self.label_field is not None:
+            return self.label_field
+        for field in self.queryset.model._meta.concrete_fields:
+            if isinstance(field, (models.CharField, models.TextField)) and not field.choices:
+                return field.name
+        return None
+
+    def autocomplete_page(self, term=None, after=None, page_size=20):
+        """
+        One page of autocomplete results ordered by pk. `after` is the last pk
+        of the previous page, so every page is an index seek instead of an
+        OFFSET scan. Returns a list of (pk, label) pairs and the "more" flag.
+        """
+        qs = self.queryset.order_by('pk')
+        if term:
+            search_field = self.search_field
+            if search_field is None:
+                raise ImproperlyConfigured('%s has no text field to search, give the autocomplete filter '
+                                           'a label field in Meta.autocomplete' % self.queryset.model.__name__)
+            qs = qs.filter(**{'__'.join([search_field, 'icontains']): term})
+        if after not in (None, ''):
+            qs = qs.filter(pk__gt=qs.model._meta.pk.to_python(after))
+        if self.label_field is not None:
+            rows = [(pk, force_text(label)) for pk, label in qs.values_list('pk', self.label_field)[:page_size + 1]]
+        else:
+            rows = [(obj.pk, force_text(obj)) for obj in qs[:page_size + 1]]
+        return rows[:page_size], len(rows) > page_size
 
 
 class ModelChoiceFilterWithEmpty(BaseModelChoiceFilter):
@@ -0,0 +1,189 @@
+# coding: utf-8
+"""
+Full-text search on text columns through the database's own full-text index:
+an external content FTS5 table kept in sync by triggers on SQLite, a GIN
+index on to_tsvector() on PostgreSQL and a FULLTEXT index on MySQL.
+
+The index is created with the CreateFullTextIndex migration operation (or
+create_index_sql() for hand written setups) and queried with the `fulltext`
+lookup, which matches every word of the query as a prefix.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.migrations.operations.base import Operation
+from django.db.models import CharField, Lookup, TextField
+from django.db.models.expressions import RawSQL
+
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def words(query):
+    return WORD_RE.findall(query or '')
+
+
+def search_config():
+    # a literal, not a parameter: the query must repeat the indexed expression
+    return "'%s'" % getattr(settings, 'FILTERS_FULLTEXT_CONFIG', 'simple').replace("'", "''")
+
+
+def fts_table(model, field):
+    return '%s_%s_fts' % (model._meta.db_table, field.column)
+
+
+def prepare_query(vendor, query):
+    if vendor == 'sqlite':
+        return ' '.join('"%s"*' % word for word in words(query))
+    if vendor == 'postgresql':
+        return ' & '.join('%s:*' % word for word in words(query))
+    if vendor == 'mysql':
+        return ' '.join('+%s*' % word for word in words(query))
+    return query
+
+
+class FullTextSearch(Lookup):
+    lookup_name = 'fulltext'
+
+    def get_prep_lookup(self):
+        return self.rhs
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', [prepare_query(connection.vendor, value)]
+
+    def as_sql(self, compiler, connection):
+        # no full-text support: every word as a substring
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        conditions = ['UPPER(%s) LIKE UPPER(%%s)' % lhs] * len(words(self.rhs)) or ['1 = 1']
+        params = []
+        for word in words(self.rhs):
+            params.extend(lhs_params)
+            params.append('%%%s%%' % connection.ops.prep_for_like_query(word))
+        return ' AND '.join(conditions), params
+
+    def as_sqlite(self, compiler, connection):
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        model = self.lhs.target.model
+        qn = connection.ops.quote_name
+        table = qn(fts_table(model, self.lhs.target))
+        pk = '%s.%s' % (compiler.quote_name_unless_alias(self.lhs.alias), qn(model._meta.pk.column))
+        return '%s IN (SELECT rowid FROM %s WHERE %s MATCH %s)' % (pk, table, table, rhs), rhs_params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        config = search_config()
+        sql = "to_tsvector(%s, COALESCE(%s, '')) @@ to_tsquery(%s, %s)" % (config, lhs, config, rhs)
+        return sql, lhs_params + rhs_params
+
+    def as_mysql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return 'MATCH (%s) AGAINST (%s IN BOOLEAN MODE)' % (lhs, rhs), lhs_params + rhs_params
+
+CharField.register_lookup(FullTextSearch)
+TextField.register_lookup(FullTextSearch)
+
+
+def rank(qs, field_name, query, alias='fulltext_rank'):
+    """
+    Annotates the relevance of `field_name` for `query` as `alias` and orders
+    by it, most relevant first. Backends without full-text search return
+    the queryset unchanged.
+    """
+    connection = connections[qs.db]
+    model = qs.model
+    field = model._meta.get_field(field_name)
+    qn = connection.ops.quote_name
+    column = '%s.%s' % (qn(model._meta.db_table), qn(field.column))
+    params = [prepare_query(connection.vendor, query)]
+    if connection.vendor == 'sqlite':
+        table = qn(fts_table(model, field))
+        sql = '(SELECT -bm25(%s) FROM %s WHERE %s MATCH %%s AND rowid = %s.%s)' % (
+            table, table, table, qn(model._meta.db_table), qn(model._meta.pk.column))
+    elif connection.vendor == 'postgresql':
+        config = search_config()
+        sql = "ts_rank(to_tsvector(%s, COALESCE(%s, '')), to_tsquery(%s, %%s))" % (config, column, config)
+    elif connection.vendor == 'mysql':
+        sql = 'MATCH (%s) AGAINST (%%s IN BOOLEAN MODE)' % column
+    else:
+        return qs
+    return qs.annotate(**{alias: RawSQL(sql, params)}).order_by('-' + alias)
+
+
+def create_index_sql(connection, model, field):
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    name = fts_table(model, field)
+    if connection.vendor == 'sqlite':
+        pk, column = qn(model._meta.pk.column), qn(field.column)
+        values = '(%s, rowid, %s) VALUES (\'delete\', old.%s, old.%s)' % (qn(name), column, pk, column)
+        return [
+            'CREATE VIRTUAL TABLE %s USING fts5(%s, content=%s, content_rowid=%s)' % (
+                qn(name), column, qn(table), pk),
+            'CREATE TRIGGER %s AFTER INSERT ON %s BEGIN INSERT INTO %s(rowid, %s) VALUES (new.%s, new.%s); END' % (
+                qn(name + '_ai'), qn(table), qn(name), column, pk, column),
+            'CREATE TRIGGER %s AFTER DELETE ON %s BEGIN INSERT INTO %s%s; END' % (
+                qn(name + '_ad'), qn(table), qn(name), values),
+            'CREATE TRIGGER %s AFTER UPDATE OF %s ON %s BEGIN INSERT INTO %s%s; '
+            'INSERT INTO %s(rowid, %s) VALUES (new.%s, new.%s); END' % (
+                qn(name + '_au'), column, qn(table), qn(name), values, qn(name), column, pk, column),
+            'INSERT INTO %s(%s) VALUES (\'rebuild\')' % (qn(name), qn(name)),
+        ]
+    if connection.vendor == 'postgresql':
+        return ["CREATE INDEX %s ON %s USING gin (to_tsvector(%s, COALESCE(%s, '')))" % (
+            qn(name), qn(table), search_config(), qn(field.column))]
+    if connection.vendor == 'mysql':
+        return ['CREATE FULLTEXT INDEX %s ON %s (%s)' % (qn(name), qn(table), qn(field.column))]
+    return []
+
+
+def drop_index_sql(connection, model, field):
+    qn = connection.ops.quote_name
+    name = fts_table(model, field)
+    if connection.vendor == 'sqlite':
+        return ['DROP TRIGGER %s' % qn(name + suffix) for suffix in ('_ai', '_ad', '_au')] + [
+            'DROP TABLE %s' % qn(name)]
+    if connection.vendor == 'postgresql':
+        return ['DROP INDEX %s' % qn(name)]
+    if connection.vendor == 'mysql':
+        return ['DROP INDEX %s ON %s' % (qn(name), qn(model._meta.db_table))]
+    return []
+
+
+class CreateFullTextIndex(Operation):
+    """
+    Migration operation creating the full-text index of model_name.field_name
+    for the database it runs on.
+    """
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, model_name, field_name):
+        self.model_name = model_name
+        self.field_name = field_name
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.model_name, self.field_name], {}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def run_sql(self, schema_editor, statements):
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.field_name)
+        self.run_sql(schema_editor, create_index_sql(schema_editor.connection, model, field))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.field_name)
+        self.run_sql(schema_editor, drop_index_sql(schema_editor.connection, model, field))
+
+    def describe(self):
+        return 'Create full-text index on %s.%s' % (self.model_name, self.field_name)
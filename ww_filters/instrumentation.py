@@ -0,0 +1,188 @@
+# coding: utf-8
+"""
+Tracing of filters. Set FILTERS_TRACER to the dotted path of a Tracer
+subclass, e.g. 'ww_filters.instrumentation.RequestTracer', to record for
+every applied filter the validation time and the lookup it produced, and for
+every filtered queryset its SQL and execution time. Without the setting the
+hooks cost one global lookup per filter.
+
+RequestTracer logs events to the 'ww_filters.trace' logger (TraceFormatter
+renders them) and, together with FilterTraceMiddleware, sums them up in the
+X-Filters-Trace response header.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger('ww_filters.trace')
+
+_tracer = None
+_tracer_loaded = False
+
+
+def get_tracer():
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        path = getattr(settings, 'FILTERS_TRACER', None)
+        _tracer = import_string(path)() if path else None
+        _tracer_loaded = True
+    return _tracer
+
+
+def reset_tracer(setting, **kwargs):
+    global _tracer_loaded
+    if setting == 'FILTERS_TRACER':
+        _tracer_loaded = False
+
+setting_changed.connect(reset_tracer)
+
+
+class Tracer(object):
+    def thread_state(self):
+        """
+        Tracing state of the calling thread, handed to the threads running
+        tasks on its behalf (FilterCollection.execute()).
+        """
+        return None
+
+    def set_thread_state(self, state):
+        pass
+
+    def filter_evaluated(self, bound_filter, bound_updater, q, seconds):
+        pass
+
+    def query_executed(self, queryset, sql, seconds):
+        pass
+
+
+class RequestTracer(Tracer):
+    """
+    Keeps the events of the current thread between start() and finish()
+    and logs each of them.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def start(self):
+        self._local.events = []
+
+    def finish(self):
+        events = getattr(self._local, 'events', None) or []
+        self._local.events = None
+        return events
+
+    def thread_state(self):
+        return getattr(self._local, 'events', None)
+
+    def set_thread_state(self, state):
+        # tasks of other threads append to the request's list
+        self._local.events = state
+
+    def record(self, event):
+        events = getattr(self._local, 'events', None)
+        if events is not None:
+            events.append(event)
+        logger.debug('filter trace', extra={'ww_filters': event})
+
+    def filter_evaluated(self, bound_filter, bound_updater, q, seconds):
+        self.record({
+            'filter': bound_filter.name,
+            'updater': bound_filter.updater_name,
+            'lookup': str(q) if q is not None else None,
+            'error': bound_updater.error,
+            'seconds': seconds,
+        })
+
+    def query_executed(self, queryset, sql, seconds):
+        self.record({'sql': sql, 'seconds': seconds})
+
+
+def format_event(event):
+    if 'sql' in event:
+        return 'sql %.2fms %s' % (event['seconds'] * 1000, event['sql'])
+    return '%s.%s %.2fms%s %s' % (event['filter'], event['updater'], event['seconds'] * 1000,
+                                  ' invalid' if event['error'] else '', event['lookup'])
+
+
+class TraceFormatter(logging.Formatter):
+    def format(self, record):
+        event = getattr(record, 'ww_filters', None)
+        if event is not None:
+            record.msg = format_event(event)
+            record.args = ()
+        return super(TraceFormatter, self).format(record)
+
+
+def summary(events):
+    parts = ['%s.%s=%.2fms' % (e['filter'], e['updater'], e['seconds'] * 1000) for e in events if 'filter' in e]
+    queries = [e['seconds'] for e in events if 'sql' in e]
+    if queries:
+        parts.append('sql=%dx%.2fms' % (len(queries), sum(queries) * 1000))
+    return '; '.join(parts)
+
+
+class FilterTraceMiddleware(object):
+    def process_request(self, request):
+        tracer = get_tracer()
+        if isinstance(tracer, RequestTracer):
+            tracer.start()
+
+    def process_response(self, request, response):
+        tracer = get_tracer()
+        if isinstance(tracer, RequestTracer):
+            events = tracer.finish()
+            if events:
+                response['X-Filters-Trace'] = summary(events)
+        return response
+
+
+def query_sql(queryset):
+    try:
+        return str(queryset.query)
+    except EmptyResultSet:
+        return ''
+
+
+class TracedQuerySetMixin(object):
+    tracer = None
+
+    def _fetch_all(self):
+        if self._result_cache is not None:
+            return super(TracedQuerySetMixin, self)._fetch_all()
+        start = time.time()
+        super(TracedQuerySetMixin, self)._fetch_all()
+        self.tracer.query_executed(self, query_sql(self), time.time() - start)
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        start = time.time()
+        count = super(TracedQuerySetMixin, self).count()
+        self.tracer.query_executed(self, 'COUNT ' + query_sql(self), time.time() - start)
+        return count
+
+
+_traced_classes = {}
+
+
+def traced(queryset, tracer):
+    """
+    Copy of the queryset (and of every queryset derived from it) reporting
+    its executions to the tracer.
+    """
+    if isinstance(queryset, TracedQuerySetMixin):
+        return queryset
+    key = queryset.__class__, id(tracer)
+    if key not in _traced_classes:
+        _traced_classes[key] = type(str('Traced' + queryset.__class__.__name__),
+                                    (TracedQuerySetMixin, queryset.__class__), {'tracer': tracer})
+    clone = queryset._clone()
+    clone.__class__ = _traced_classes[key]
+    return clone
@@ -0,0 +1,65 @@
+# coding: utf-8
+"""
+The `inlist` lookup: IN for value lists of any length. Lists up to
+FILTERS_IN_CHUNK_SIZE values are a plain IN. Longer lists are sent as one
+array parameter on PostgreSQL, as one JSON parameter on SQLite and as OR'ed
+IN chunks elsewhere, so they stay under the backends' limits on query
+parameters and IN list items.
+"""
+
+import json
+
+from django.conf import settings
+from django.db.models import Field, Lookup
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils import six
+
+
+def chunk_size():
+    return getattr(settings, 'FILTERS_IN_CHUNK_SIZE', 500)
+
+
+class InList(Lookup):
+    lookup_name = 'inlist'
+
+    def get_prep_lookup(self):
+        field = self.lhs.output_field
+        return [field.get_prep_value(value) for value in self.rhs]
+
+    def db_values(self, connection):
+        field = self.lhs.output_field
+        return [field.get_db_prep_value(value, connection, prepared=True) for value in self.rhs]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        values = self.db_values(connection)
+        if not values:
+            raise EmptyResultSet
+        size = chunk_size()
+        conditions, params = [], []
+        for i in range(0, len(values), size):
+            chunk = values[i:i + size]
+            conditions.append('%s IN (%s)' % (lhs, ', '.join(['%s'] * len(chunk))))
+            params.extend(lhs_params)
+            params.extend(chunk)
+        if len(conditions) == 1:
+            return conditions[0], params
+        return '(%s)' % ' OR '.join(conditions), params
+
+    def as_postgresql(self, compiler, connection):
+        if len(self.rhs) <= chunk_size():
+            return self.as_sql(compiler, connection)
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        # psycopg2 sends the list as an ARRAY of the values' types; no cast,
+        # db_type() is no type name for serial primary keys
+        return '%s = ANY(%%s)' % lhs, lhs_params + [self.db_values(connection)]
+
+    def as_sqlite(self, compiler, connection):
+        values = self.db_values(connection)
+        if len(values) <= chunk_size() or \
+                not all(isinstance(v, six.integer_types + six.string_types) for v in values):
+            return self.as_sql(compiler, connection)
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return '%s IN (SELECT value FROM json_each(%%s))' % lhs, lhs_params + [json.dumps(values)]
+
+Field.register_lookup(InList)
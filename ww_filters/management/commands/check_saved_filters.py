@@ -0,0 +1,110 @@
+# coding: utf-8
+
+import json
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Case, TextField, Value, When
+from django.http import QueryDict
+from django.utils.http import urlencode
+
+from ...cache import model_versions
+from ...filter_collections import payload_params
+from ...models import SavedFilters
+
+
+def check_saved_filter(row):
+    """
+    Validates one saved filter against the current collection of its type.
+    Returns (pk, payload, problems): payload is the cleaned payload with the
+    valid filters only, or None if the whole row is unusable.
+    """
+    pk, type_, data = row
+    filter_ = settings.FILTERS_BY_TYPE.get(type_)
+    if filter_ is None:
+        return pk, None, ['unknown type %s' % type_]
+    collection = filter_[0]
+    if data.startswith('?'):
+        # query string stored before payloads were introduced
+        stored = None
+        params = QueryDict(data[1:])
+    else:
+        try:
+            stored = json.loads(data)
+        except ValueError:
+            return pk, None, ['invalid data']
+        params = QueryDict(urlencode(payload_params(stored), doseq=True))
+    payload, errors = collection.clean_payload(params)
+    problems = ['invalid filter %s' % name for name in errors]
+    if stored is not None:
+        problems.extend('unknown filter %s' % name for name in stored if name not in collection.base_filters)
+    elif not problems:
+        problems.append('old format')
+    return pk, payload or None, problems
+
+
+class Command(BaseCommand):
+    help = 'Validates saved filters against the current filter collections and optionally repairs them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help='Drop invalid filters from saved filters, delete the ones left empty.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Validate in a pool of worker processes.')
+
+    def handle(self, *args, **options):
+        pool = None
+        if options['processes'] > 1:
+            # workers must not share the parent's database connections
+            connections.close_all()
+            pool = multiprocessing.Pool(options['processes'], initializer=connections.close_all)
+        checked = broken = 0
+        try:
+            for chunk in self.chunks(options['chunk_size']):
+                if pool is not None:
+                    results = pool.map(check_saved_filter, chunk)
+                else:
+                    results = [check_saved_filter(row) for row in chunk]
+                updates, deletes = {}, []
+                for pk, payload, problems in results:
+                    checked += 1
+                    if not problems:
+                        continue
+                    broken += 1
+                    self.stdout.write('%s: %s' % (pk, ', '.join(problems)))
+                    if payload is None:
+                        deletes.append(pk)
+                    else:
+                        updates[pk] = json.dumps(payload, sort_keys=True)
+                if options['repair']:
+                    self.repair(updates, deletes)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if options['repair'] and broken:
+            # QuerySet.update() and delete() of a list send no post_save
+            model_versions.bump(SavedFilters)
+        self.stdout.write('%d saved filters checked, %d broken%s' % (
+            checked, broken, ', repaired' if options['repair'] and broken else ''))
+
+    def chunks(self, chunk_size):
+        last_pk = 0
+        while True:
+            chunk = list(SavedFilters.objects.filter(pk__gt=last_pk).order_by('pk')
+                         .values_list('pk', 'type', 'data')[:chunk_size].iterator())
+            if not chunk:
+                return
+            last_pk = chunk[-1][0]
+            yield chunk
+
+    def repair(self, updates, deletes):
+        with transaction.atomic():
+            if updates:
+                SavedFilters.objects.filter(pk__in=list(updates)).update(data=Case(
+                    *[When(pk=pk, then=Value(data)) for pk, data in updates.items()], output_field=TextField()))
+            if deletes:
+                SavedFilters.objects.filter(pk__in=deletes).delete()
@@ -0,0 +1,162 @@
+# coding: utf-8
+
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.utils import six
+
+from ...filter_collections import lookup_path
+
+
+#: lookups a plain B-tree index on the column can serve
+BTREE_LOOKUPS = ('exact', 'in', 'inlist', 'range', 'lt', 'gt', 'lte', 'gte', 'isnull')
+
+
+MIGRATION_TEMPLATE = '''# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+%(dependencies)s
+    ]
+
+    operations = [
+%(operations)s
+    ]
+'''
+
+
+def index_name(table, column, kind):
+    return 'wwf_%s_%s' % (hashlib.md5(('%s.%s' % (table, column)).encode('utf-8')).hexdigest()[:12], kind)
+
+
+def required_index(lookup):
+    """
+    Kind of index a lookup needs: 'btree', 'upper' (an UPPER() expression
+    index usable by LIKE 'x%') or 'trgm' (a trigram index for LIKE '%x%').
+    """
+    if lookup in BTREE_LOOKUPS:
+        return 'btree'
+    if lookup == 'istartswith':
+        return 'upper'
+    if lookup in ('iendswith', 'icontains'):
+        return 'trgm'
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Reports filters of settings.FILTERS_BY_TYPE collections that no database index can serve.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--migration', metavar='APP_LABEL',
+                            help='Print a migration of APP_LABEL creating the missing indexes.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        # keep stdout clean for the migration source
+        report = self.stderr if options['migration'] else self.stdout
+        missing = []
+        seen = set()
+        for type_, (collection, model) in sorted(six.iteritems(settings.FILTERS_BY_TYPE)):
+            for filter_name, filter_ in six.iteritems(collection.base_filters):
+                try:
+                    # paths of related fields are checked on the related table
+                    field = lookup_path(model, filter_name)[0]
+                except Exception:
+                    continue
+                if not getattr(field, 'column', None):
+                    continue
+                for updater_name, updater in six.iteritems(filter_.updaters):
+                    kind = required_index(updater.lookup)
+                    if kind is None or self.has_index(connection, field.model, field, kind):
+                        continue
+                    report.write('%s\t%s.%s\t%s\t%s\t%s index on %s.%s' % (
+                        type_, collection.__name__, filter_name, updater_name, updater.lookup, kind,
+                        field.model._meta.db_table, field.column))
+                    if (field.model, field.column, kind) not in seen:
+                        seen.add((field.model, field.column, kind))
+                        missing.append((field.model, field, kind))
+
+        if options['migration']:
+            self.stdout.write(self.migration(connection, options['migration'], missing))
+
+    def introspect(self, connection, table):
+        if not hasattr(self, '_introspected'):
+            self._introspected = {}
+        if table not in self._introspected:
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, table)
+                definitions = {}
+                if connection.vendor == 'postgresql':
+                    cursor.execute('SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s', [table])
+                    definitions = dict(cursor.fetchall())
+            self._introspected[table] = constraints, definitions
+        return self._introspected[table]
+
+    def has_index(self, connection, model, field, kind):
+        opts = model._meta
+        column = field.column
+        constraints, definitions = self.introspect(connection, opts.db_table)
+        if index_name(opts.db_table, column, kind) in constraints:
+            return True
+        if kind == 'btree':
+            if field.db_index or field.unique or field.primary_key:
+                return True
+            if any(fields[0] == field.name for fields in opts.index_together):
+                return True
+            if any(index.fields[0].lstrip('-') == field.name for index in getattr(opts, 'indexes', ())):
+                return True
+            return any(c['index'] and c['columns'] and c['columns'][0] == column for c in constraints.values())
+        if kind == 'upper' and connection.vendor == 'mysql':
+            # case insensitive collations let LIKE use the plain index
+            return self.has_index(connection, model, field, 'btree')
+        # exactly UPPER(column), as pg_indexes prints it: upper((col)::text)
+        expression = re.compile(r'upper\(\(?"?%s"?\)?::text\)' % re.escape(column.lower()))
+        for definition in definitions.values():
+            definition = definition.lower()
+            if expression.search(definition):
+                if kind == 'upper' or 'gin_trgm_ops' in definition:
+                    return True
+        return False
+
+    def migration(self, connection, app_label, missing):
+        loader = MigrationLoader(connection, ignore_no_migrations=True)
+        leaves = [node for node in loader.graph.leaf_nodes() if node[0] == app_label]
+        qn = connection.ops.quote_name
+        operations = []
+        trgm = False
+        for model, field, kind in missing:
+            table = model._meta.db_table
+            name = index_name(table, field.column, kind)
+            if kind == 'btree':
+                sql = 'CREATE INDEX %s ON %s (%s)' % (qn(name), qn(table), qn(field.column))
+            elif connection.vendor != 'postgresql':
+                continue
+            elif kind == 'upper':
+                sql = 'CREATE INDEX %s ON %s (UPPER(%s::text) text_pattern_ops)' % (
+                    qn(name), qn(table), qn(field.column))
+            else:
+                trgm = True
+                sql = 'CREATE INDEX %s ON %s USING gin (UPPER(%s::text) gin_trgm_ops)' % (
+                    qn(name), qn(table), qn(field.column))
+            if connection.vendor == 'mysql':
+                reverse_sql = 'DROP INDEX %s ON %s' % (qn(name), qn(table))
+            else:
+                reverse_sql = 'DROP INDEX %s' % qn(name)
+            operations.append('        migrations.RunSQL(%r, %r),' % (str(sql), str(reverse_sql)))
+        if trgm:
+            operations.insert(0, "        migrations.RunSQL('CREATE EXTENSION IF NOT EXISTS pg_trgm', "
+                                 "migrations.RunSQL.noop),")
+        return MIGRATION_TEMPLATE % {
+            'dependencies': '\n'.join('        (%r, %r),' % (str(a), str(n)) for a, n in leaves),
+            'operations': '\n'.join(operations),
+        }
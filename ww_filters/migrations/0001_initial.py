@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # the schema of installs predating migrations: fake it there with
+    # manage.py migrate ww_filters 0001 --fake
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedFilters',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=100, verbose_name='Filter Name')),
+                ('data', models.CharField(max_length=255)),
+                ('source', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=30)),
+                ('user', models.ForeignKey(verbose_name='User', on_delete=django.db.models.deletion.PROTECT,
+                                           to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
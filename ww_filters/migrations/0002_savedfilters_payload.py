@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ww_filters', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='savedfilters',
+            name='data',
+            field=models.TextField(),
+        ),
+        migrations.AlterIndexTogether(
+            name='savedfilters',
+            index_together=set([('user', 'type')]),
+        ),
+    ]
@@ -1,13 +1,58 @@
 # encoding: utf-8
 
+import json
+
 from django.db import models
+from django.utils.http import urlencode
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
 
+from .cache import LayeredCache, make_key, model_versions
+
+
+#: per-user lists of saved filters, see SavedFiltersManager.for_user()
+saved_filters_cache = LayeredCache('FILTERS_SAVED_CACHE', default_timeout=3600)
+
+
+class SavedFiltersManager(models.Manager):
+    def for_user(self, user_id, type_):
+        """
+        Saved filters of the user for one collection type. Cached until any
+        saved filter is saved or deleted.
+        """
+        key = make_key('saved', user_id, type_, model_versions.get(self.model))
+        saved = saved_filters_cache.get(key)
+        if saved is None:
+            saved = list(self.filter(user_id=user_id, type=type_).order_by('name'))
+            saved_filters_cache.set(key, saved)
+        return saved
+
 
 class SavedFilters(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, verbose_name=_('User'))
     name = models.CharField(max_length=100, verbose_name=_('Filter Name'))
-    data = models.CharField(max_length=255)
+    # JSON: {filter name: {updater name: {form field: cleaned value}}}
+    data = models.TextField()
     source = models.CharField(max_length=255)
     type = models.CharField(max_length=30)
+
+    objects = SavedFiltersManager()
+
+    class Meta:
+        index_together = [('user', 'type')]
+
+    @property
+    def payload(self):
+        return json.loads(self.data)
+
+    @payload.setter
+    def payload(self, value):
+        self.data = json.dumps(value, sort_keys=True)
+
+    @property
+    def query_string(self):
+        if self.data.startswith('?'):
+            # stored before payloads, until check_saved_filters --repair
+            return self.data
+        from .filter_collections import payload_params
+        return '?' + urlencode(payload_params(self.payload))
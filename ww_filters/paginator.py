@@ -0,0 +1,160 @@
+# coding: utf-8
+
+from django.core import signing
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.encoding import force_text
+
+
+class FilterPage(Page):
+    more = None
+
+    def has_next(self):
+        if self.more is not None:
+            return self.more
+        return super(FilterPage, self).has_next()
+
+
+class FilterPaginator(Paginator):
+    """
+    Paginator over a filter collection that never runs an unbounded COUNT
+    when the collection has a count_threshold (or `threshold` is given).
+
+    Above the threshold count_is_exact is False, count is a lower bound or a
+    planner estimate, and pages are not limited by num_pages: each page reads
+    one extra row to know whether there is a next one.
+    """
+    def __init__(self, filter_collection, per_page, orphans=0, allow_empty_first_page=True, threshold=None):
+        self.filter_collection = filter_collection
+        self.threshold = threshold
+        self._count_exact = True
+        super(FilterPaginator, self).__init__(filter_collection.update_qs(), per_page, orphans,
+                                              allow_empty_first_page)
+
+    def _get_count(self):
+        if self._count is None:
+            self._count, self._count_exact = self.filter_collection.bounded_count(self.threshold)
+        return self._count
+    count = property(_get_count)
+
+    @property
+    def count_is_exact(self):
+        self._get_count()
+        return self._count_exact
+
+    @property
+    def count_display(self):
+        if self.count_is_exact:
+            return str(self.count)
+        return '%s+' % self.count
+
+    def validate_number(self, number):
+        if self.count_is_exact:
+            return super(FilterPaginator, self).validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super(FilterPaginator, self).page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = self._get_page(object_list[:self.per_page], number, self)
+        page.more = len(object_list) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return FilterPage(*args, **kwargs)
+
+
+class KeysetPage(object):
+    def __init__(self, object_list, paginator, next_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator(object):
+    """
+    Seek pagination over a filter collection. Instead of OFFSET, every page
+    continues after the sort key of the last row of the previous one, so deep
+    pages cost the same as the first one given an index on the ordering.
+
+    `ordering` defaults to the queryset ordering; pk is appended to make it
+    unique. Only fields of the model itself are supported and they should
+    not be nullable. Cursors are signed and carry the filter state: a cursor
+    from another filter state raises InvalidPage.
+    """
+    salt = 'ww_filters.keyset'
+
+    def __init__(self, filter_collection, per_page, ordering=None):
+        self.filter_collection = filter_collection
+        self.per_page = int(per_page)
+        self.object_list = filter_collection.update_qs()
+        if ordering is None:
+            ordering = self.object_list.query.order_by or self.object_list.model._meta.ordering
+        ordering = [o for o in ordering if o != '?']
+        if not any(o.lstrip('-') in ('pk', self.object_list.model._meta.pk.name) for o in ordering):
+            ordering.append('pk')
+        self.ordering = ordering
+
+    def get_field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def encode(self, obj):
+        values = []
+        for o in self.ordering:
+            value = getattr(obj, self.get_field(o.lstrip('-')).attname)
+            values.append(force_text(value) if value is not None else None)
+        return signing.dumps({'state': self.filter_collection.state_key(versioned=False), 'key': values},
+                             salt=self.salt, compress=True)
+
+    def decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+        except signing.BadSignature:
+            raise InvalidPage('Invalid cursor')
+        if data.get('state') != self.filter_collection.state_key(versioned=False):
+            raise InvalidPage('The cursor belongs to other filters')
+        values = data['key']
+        if len(values) != len(self.ordering):
+            raise InvalidPage('Invalid cursor')
+        return [self.get_field(o.lstrip('-')).to_python(v) if v is not None else None
+                for o, v in zip(self.ordering, values)]
+
+    def seek_q(self, values):
+        q = Q()
+        for i, o in enumerate(self.ordering):
+            name = o.lstrip('-')
+            condition = Q(**{'__'.join([name, 'lt' if o.startswith('-') else 'gt']): values[i]})
+            for prev, value in zip(self.ordering[:i], values[:i]):
+                condition &= Q(**{prev.lstrip('-'): value})
+            q |= condition
+        return q
+
+    def page(self, cursor=None):
+        qs = self.object_list.order_by(*self.ordering)
+        if cursor:
+            qs = qs.filter(self.seek_q(self.decode(cursor)))
+        object_list = list(qs[:self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode(object_list[-1])
+        return KeysetPage(object_list, self, next_cursor)
@@ -0,0 +1,128 @@
+# coding: utf-8
+"""
+Mapping of model field classes to the filters ModelFilterCollection creates
+for them. A field gets the filter registered for the nearest class in its
+MRO, so subclasses of the built-in fields need no registration. Third-party
+fields are registered with:
+
+    @registry.register(MyField)
+    def my_field_filter(field, name, title, select2, opts):
+        return MyFilter(title=title)
+
+Fields with choices get a choice filter whatever their class, fields with no
+registered class in their MRO get no filter.
+"""
+
+import threading
+
+from django.db.models import fields
+from django.db.models.fields import related
+
+from . import filters
+
+
+class FilterRegistry(object):
+    def __init__(self):
+        self._factories = {}
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def register(self, field_class, factory=None):
+        """
+        Registers factory(field, name, title, select2, opts) for field_class;
+        name is the filter name (the lookup path for fields of related
+        models) and opts are the ModelFilterCollectionOptions of the
+        collection. Without `factory` works as a decorator.
+        """
+        if factory is None:
+            def decorator(factory):
+                self.register(field_class, factory)
+                return factory
+            return decorator
+        with self._lock:
+            self._factories[field_class] = factory
+            self._resolved = {}
+
+    def unregister(self, field_class):
+        with self._lock:
+            self._factories.pop(field_class, None)
+            self._resolved = {}
+
+    def factory_for(self, field_class):
+        try:
+            return self._resolved[field_class]
+        except KeyError:
+            pass
+        factory = None
+        for klass in field_class.__mro__:
+            if klass in self._factories:
+                factory = self._factories[klass]
+                break
+        self._resolved[field_class] = factory
+        return factory
+
+    def filter_for_field(self, field, name, title, select2, opts):
+        if field.choices and field.rel is None:
+            return choice_filter(field, name, title, select2, opts)
+        factory = self.factory_for(type(field))
+        if factory is None:
+            return None
+        return factory(field, name, title, select2, opts)
+
+
+registry = FilterRegistry()
+
+
+def choice_filter(field, name, title, select2, opts):
+    if field.blank:
+        return filters.ChoiceFilterWithEmpty(title=title, choices=field.choices, select2=select2)
+    return filters.BaseChoiceFilter(title=title, choices=field.choices, select2=select2)
+
+
+@registry.register(related.ForeignKey)
+def model_choice_filter(field, name, title, select2, opts):
+    autocomplete = opts.autocomplete is not None and name in opts.autocomplete
+    label_field = opts.autocomplete.get(name) if isinstance(opts.autocomplete, dict) else None
+    filter_class = filters.ModelChoiceFilterWithEmpty if field.blank else filters.BaseModelChoiceFilter
+    return filter_class(title=title, select2=select2, queryset=field.rel.to._default_manager.all(),
+                        autocomplete=autocomplete, label_field=label_field)
+
+
+@registry.register(fields.CharField)
+@registry.register(fields.TextField)
+def string_filter(field, name, title, select2, opts):
+    if opts.fulltext is not None and name in opts.fulltext:
+        if field.blank:
+            return filters.FullTextFilterWithEmpty(title=title)
+        return filters.FullTextFilter(title=title)
+    if field.blank:
+        return filters.StringFilterWithEmpty(title=title)
+    return filters.BaseStringFilter(title=title)
+
+
+@registry.register(fields.IntegerField)
+@registry.register(fields.DecimalField)
+@registry.register(fields.FloatField)
+def integer_filter(field, name, title, select2, opts):
+    if field.blank:
+        return filters.IntegerFilterWithEmpty(title=title)
+    return filters.BaseIntegerFilter(title=title)
+
+
+@registry.register(fields.DateTimeField)
+def datetime_filter(field, name, title, select2, opts):
+    if field.blank:
+        return filters.DateTimeFilterWithEmpty(title=title)
+    return filters.BaseDateTimeFilter(title=title)
+
+
+@registry.register(fields.DateField)
+def date_filter(field, name, title, select2, opts):
+    if field.blank:
+        return filters.DateFilterWithEmpty(title=title)
+    return filters.BaseDateFilter(title=title)
+
+
+@registry.register(fields.BooleanField)
+def boolean_filter(field, name, title, select2, opts):
+    return filters.BooleanFilter(title=title)
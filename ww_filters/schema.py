@@ -0,0 +1,116 @@
+# coding: utf-8
+"""
+JSON description of a filter collection, used by the compact mode of the
+ww_filters template tag to build the filter UI in the browser instead of
+rendering it into every page.
+
+The schema depends only on the collection class and the active language:
+model choice filters point to the autocomplete view instead of listing rows.
+It is cached and served with a strong ETag, the hash of its JSON.
+"""
+
+import hashlib
+import json
+
+from django import forms
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db.models import Model
+from django.utils import six
+from django.utils.encoding import force_bytes, force_text
+from django.utils.translation import get_language
+
+from .cache import LayeredCache, make_key
+from .filter_collections import serialize_value
+
+
+#: format of the schema, changed on incompatible changes
+SCHEMA_VERSION = 1
+
+#: (schema json, etag) by collection, type and language
+schema_cache = LayeredCache('FILTERS_SCHEMA_CACHE', default_size=100)
+
+
+def field_schema(form, name, field):
+    schema = {
+        'name': form.add_prefix(name),
+        'label': force_text(field.label) if field.label is not None else None,
+        'type': type(field).__name__,
+        'required': field.required,
+        'widget': type(field.widget).__name__,
+        'input_type': getattr(field.widget, 'input_type', None),
+    }
+    if isinstance(field, forms.ModelChoiceField):
+        schema['autocomplete'] = True
+    elif isinstance(field, forms.ChoiceField):
+        schema['choices'] = [[force_text(k), force_text(v)] for k, v in field.choices]
+    return schema
+
+
+def filter_schema(type_, name, filter_):
+    updaters = []
+    for uname, updater in six.iteritems(filter_.updaters):
+        form = updater.get_form(filter_, name, None)
+        updaters.append({
+            'name': uname,
+            'title': force_text(updater.title),
+            'fields': [field_schema(form, field_name, field) for field_name, field in six.iteritems(form.fields)],
+        })
+    schema = {
+        'name': name,
+        'title': force_text(filter_.title),
+        'type': type(filter_).__name__,
+        'updaters': updaters,
+    }
+    if getattr(filter_, 'queryset', None) is not None:
+        schema['autocomplete_url'] = reverse('filters:autocomplete', args=[type_, name])
+        schema['select2'] = True
+    elif getattr(filter_, 'select2', False):
+        schema['select2'] = True
+    return schema
+
+
+def collection_schema(collection, type_):
+    return {
+        'version': SCHEMA_VERSION,
+        'type': type_,
+        'filters': [filter_schema(type_, name, f) for name, f in six.iteritems(collection.base_filters)],
+    }
+
+
+def cached_schema(collection, type_):
+    """
+    (JSON of collection_schema(), strong ETag).
+    """
+    key = make_key('schema', collection.__module__, collection.__name__, type_, get_language(),
+                   getattr(settings, 'FILTERS_SCHEMA_VERSION', ''), SCHEMA_VERSION)
+    result = schema_cache.get(key)
+    if result is None:
+        content = json.dumps(collection_schema(collection, type_), sort_keys=True)
+        result = content, '"%s"' % hashlib.md5(force_bytes(content)).hexdigest()
+        schema_cache.set(key, result)
+    return result
+
+
+def bound_state(filter_collection):
+    """
+    Selected updater and submitted values of every applied filter, with
+    labels of model choices: {name: {'updater', 'values', 'labels'}}.
+    Only valid after update_qs().
+    """
+    state = {}
+    for name, bound_filter in six.iteritems(filter_collection.filters):
+        updater = bound_filter.bound_updater
+        if updater is None:
+            continue
+        form = updater.form
+        values, labels = {}, {}
+        for field_name, field in six.iteritems(form.fields):
+            key = form.add_prefix(field_name)
+            value = field.widget.value_from_datadict(form.data, form.files, key)
+            values[key] = value
+            cleaned = form.cleaned_data.get(field_name) if form.is_valid() else None
+            if isinstance(cleaned, Model):
+                labels[key] = [[serialize_value(cleaned), bound_filter.filter.label_from_instance(cleaned)]]
+        state[name] = {'updater': bound_filter.updater_name, 'values': values, 'labels': labels}
+    return state
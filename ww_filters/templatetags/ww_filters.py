@@ -1,9 +1,29 @@
+import json
+
 from django import template
 
+from ..models import SavedFilters
+from ..schema import bound_state
+
 register = template.Library()
 
 
 @register.inclusion_tag('ww_filters/_list_forms.html', takes_context=True)
-def ww_filters(context, type_):
+def ww_filters(context, type_, lazy_subforms=False, compact=False):
+    """
+    Saved filters of the user are listed from SavedFilters.objects.for_user()
+    unless the context has `saved`.
+
+    With `compact` the filter UI is built in the browser from the cached
+    schema view; the page only carries the applied filters.
+    """
     context['type'] = type_
+    if 'saved' not in context:
+        user = context.get('user') or getattr(context.get('request'), 'user', None)
+        if user is not None and user.is_authenticated():
+            context['saved'] = SavedFilters.objects.for_user(user.pk, type_)
+    context['lazy_subforms'] = lazy_subforms
+    context['compact'] = compact
+    if compact:
+        context['bound_json'] = json.dumps(bound_state(context['filter_collection'])).replace('</', '<\\/')
     return context
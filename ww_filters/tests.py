@@ -0,0 +1,245 @@
+# coding: utf-8
+
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.db import connection, models
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import urlencode
+
+from . import lookups  # noqa, registers the inlist lookup
+from .filter_collections import ModelFilterCollection, payload_params
+from .paginator import KeysetPaginator
+from .updaters import ThisWeek
+
+
+class Invoice(models.Model):
+    number = models.CharField(max_length=20)
+    status = models.CharField(max_length=1, choices=[('o', 'Open'), ('p', 'Paid')])
+    total = models.IntegerField()
+    day = models.DateField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'ww_filters'
+        managed = False
+
+
+class InvoiceLine(models.Model):
+    invoice = models.ForeignKey(Invoice, related_name='lines')
+    kind = models.CharField(max_length=1, choices=[('a', 'A'), ('b', 'B')])
+    qty = models.IntegerField()
+
+    class Meta:
+        app_label = 'ww_filters'
+        managed = False
+
+
+class InvoiceFilters(ModelFilterCollection):
+    class Meta:
+        model = Invoice
+        fields = ['number', 'status', 'total', 'day', 'lines__kind', 'lines__qty']
+
+
+class InvoiceTestCase(TestCase):
+    """
+    Three invoices of totals 10, 20 and 30 with four lines each. The test
+    models are unmanaged, their tables are created here.
+    """
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(Invoice)
+            editor.create_model(InvoiceLine)
+        super(InvoiceTestCase, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(InvoiceTestCase, cls).tearDownClass()
+        with connection.schema_editor() as editor:
+            editor.delete_model(InvoiceLine)
+            editor.delete_model(Invoice)
+
+    def setUp(self):
+        for i in range(1, 4):
+            invoice = Invoice.objects.create(number='N%d' % i, status='p' if i == 3 else 'o', total=i * 10)
+            for j in range(4):
+                InvoiceLine.objects.create(invoice=invoice, kind='a', qty=i * 10 + j)
+
+    def collection(self, **data):
+        return InvoiceFilters(Invoice.objects.order_by('pk'), data)
+
+    def numbers(self, qs):
+        return list(qs.values_list('number', flat=True))
+
+
+@override_settings(FILTERS_IN_CHUNK_SIZE=3)
+class InListTest(SimpleTestCase):
+    def compile(self, qs, vendor=None):
+        compiler = qs.query.get_compiler(connection=connection)
+        lookup = qs.query.where.children[0]
+        as_vendor = getattr(lookup, 'as_' + vendor) if vendor else lookup.as_sql
+        return as_vendor(compiler, connection)
+
+    def test_short_list_is_plain_in(self):
+        sql, params = self.compile(User.objects.filter(pk__inlist=[3, 1, 2]), 'postgresql')
+        self.assertTrue(sql.endswith('IN (%s, %s, %s)'))
+        self.assertEqual(params, [3, 1, 2])
+
+    def test_long_list_is_chunked(self):
+        sql, params = self.compile(User.objects.filter(pk__inlist=range(7)))
+        self.assertEqual(sql.count(' OR '), 2)
+        self.assertEqual(params, list(range(7)))
+
+    def test_postgresql_array_of_auto_field(self):
+        sql, params = self.compile(User.objects.filter(pk__inlist=range(7)), 'postgresql')
+        self.assertTrue(sql.endswith('= ANY(%s)'), sql)
+        self.assertNotIn('serial', sql)
+        self.assertEqual(params, [list(range(7))])
+
+    def test_postgresql_array_of_foreign_key_pk(self):
+        sql, params = self.compile(Permission.objects.filter(content_type__pk__inlist=range(7)), 'postgresql')
+        self.assertTrue(sql.endswith('= ANY(%s)'), sql)
+        self.assertEqual(params, [list(range(7))])
+
+    def test_empty_list_matches_nothing(self):
+        self.assertRaises(EmptyResultSet, self.compile, User.objects.filter(pk__inlist=[]))
+
+
+class FacetsTest(InvoiceTestCase):
+    def test_multi_valued_facets_count_rows_once(self):
+        facets = self.collection().facets(['status', 'lines__kind'])
+        self.assertEqual(facets['lines__kind'], [('a', 'A', 3)])
+        self.assertEqual(sorted(facets['status']), [('o', 'Open', 2), ('p', 'Paid', 1)])
+
+
+class StatsTest(InvoiceTestCase):
+    def test_multi_valued_path_does_not_repeat_rows(self):
+        alone = self.collection().stats(['total'], buckets=3)['total']
+        stats = self.collection().stats(['total', 'lines__qty'], buckets=3)
+        self.assertEqual([count for start, end, count in alone['buckets']], [1, 1, 1])
+        self.assertEqual(stats['total'], alone)
+        self.assertEqual((stats['lines__qty']['min'], stats['lines__qty']['max']), (10, 33))
+        self.assertEqual([count for start, end, count in stats['lines__qty']['buckets']], [1, 1, 1])
+
+    def test_filtered(self):
+        stats = self.collection(total_filter='greater_than', **{'total_filter-value': '15'}).stats(['total'])
+        self.assertEqual((stats['total']['min'], stats['total']['max']), (20, 30))
+
+
+class BoundedCountTest(InvoiceTestCase):
+    def test_exact_under_threshold(self):
+        self.assertEqual(self.collection().bounded_count(3), (3, True))
+
+    def test_bounded_over_threshold(self):
+        self.assertEqual(self.collection().bounded_count(2), (2, False))
+
+
+NUMBER_N = {'number_filter': 'starts_with', 'number_filter-value': 'N'}
+
+
+def total_over(value):
+    return dict(NUMBER_N, **{'total_filter': 'greater_than', 'total_filter-value': str(value)})
+
+
+@override_settings(FILTERS_REFINE_CACHE_SIZE=100)
+class RefineTest(InvoiceTestCase):
+    def update_qs(self, data):
+        collection = self.collection(**data)
+        with CaptureQueriesContext(connection) as queries:
+            qs = collection.update_qs()
+        return qs, [query['sql'] for query in queries]
+
+    def test_refined_state_equals_full_query(self):
+        qs, queries = self.update_qs(NUMBER_N)
+        self.assertEqual(self.numbers(qs), ['N1', 'N2', 'N3'])
+        qs, queries = self.update_qs(total_over(15))
+        # only the added condition, restricted to the parent's pks
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"total" >', queries[0])
+        self.assertNotIn('LIKE', queries[0])
+        full = Invoice.objects.filter(number__startswith='N', total__gt=15).order_by('pk')
+        self.assertEqual(self.numbers(qs), self.numbers(full))
+
+    def test_cached_state_runs_no_query(self):
+        self.update_qs(NUMBER_N)
+        self.assertEqual(self.update_qs(NUMBER_N)[1], [])
+
+    def test_data_changes_invalidate(self):
+        self.update_qs(NUMBER_N)
+        self.update_qs(total_over(15))
+        Invoice.objects.create(number='N4', status='o', total=40)
+        self.assertEqual(self.numbers(self.update_qs(NUMBER_N)[0]), ['N1', 'N2', 'N3', 'N4'])
+        self.assertEqual(self.numbers(self.update_qs(total_over(15))[0]), ['N2', 'N3', 'N4'])
+
+    def test_relaxed_condition_refines_from_parent(self):
+        self.update_qs(NUMBER_N)
+        self.assertEqual(self.numbers(self.update_qs(total_over(25))[0]), ['N3'])
+        qs, queries = self.update_qs(total_over(15))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.numbers(qs), ['N2', 'N3'])
+
+    def test_state_without_cached_parent_is_not_probed(self):
+        qs, queries = self.update_qs(total_over(15))
+        self.assertEqual(queries, [])
+        self.assertEqual(self.numbers(qs), ['N2', 'N3'])
+
+    def test_no_conditions(self):
+        qs, queries = self.update_qs({'page': '2'})
+        self.assertEqual(queries, [])
+        self.assertEqual(self.numbers(qs), ['N1', 'N2', 'N3'])
+
+
+class KeysetPaginatorTest(InvoiceTestCase):
+    def test_pages_cover_all_rows_once(self):
+        for i in range(4, 12):
+            Invoice.objects.create(number='N%d' % i, status='p' if i % 3 else 'o', total=i * 10)
+        paginator = KeysetPaginator(self.collection(**NUMBER_N), 2, ordering=['status'])
+        numbers, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            numbers.extend(invoice.number for invoice in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(numbers, self.numbers(Invoice.objects.order_by('status', 'pk')))
+
+
+class PeriodTest(SimpleTestCase):
+    def week(self, day):
+        return ThisWeek('week').period({}, day)
+
+    @override_settings(FIRST_DAY_OF_WEEK=1, USE_L10N=False)
+    def test_week_from_monday(self):
+        sunday = datetime.date(2026, 10, 18)
+        self.assertEqual(self.week(sunday), (datetime.date(2026, 10, 12), datetime.date(2026, 10, 19)))
+        self.assertEqual(self.week(sunday + datetime.timedelta(days=1)),
+                         (datetime.date(2026, 10, 19), datetime.date(2026, 10, 26)))
+
+    @override_settings(FIRST_DAY_OF_WEEK=0, USE_L10N=False)
+    def test_week_from_sunday(self):
+        sunday = datetime.date(2026, 10, 18)
+        self.assertEqual(self.week(sunday), (datetime.date(2026, 10, 18), datetime.date(2026, 10, 25)))
+        self.assertEqual(self.week(sunday - datetime.timedelta(days=1)),
+                         (datetime.date(2026, 10, 11), datetime.date(2026, 10, 18)))
+
+
+class PayloadTest(SimpleTestCase):
+    def test_clean_payload_round_trip(self):
+        data = QueryDict(urlencode([
+            ('number_filter', 'starts_with'), ('number_filter-value', 'N'),
+            ('total_filter', 'in_list'), ('total_filter-value', '30, 10\n20'),
+            ('day_filter', 'range'), ('day_filter-start', '2026-10-01'), ('day_filter-end', '2026-10-18'),
+            ('status_filter', 'choice_equal'), ('status_filter-value', 'o'),
+        ]))
+        payload, errors = InvoiceFilters.clean_payload(data)
+        self.assertEqual(errors, [])
+        self.assertEqual(payload['total'], {'in_list': {'value': [10, 20, 30]}})
+        params = QueryDict(urlencode(payload_params(payload), doseq=True))
+        self.assertEqual(InvoiceFilters.clean_payload(params), (payload, []))
+
+    def test_invalid_filter(self):
+        payload, errors = InvoiceFilters.clean_payload(QueryDict('total_filter=greater_than&total_filter-value=x'))
+        self.assertEqual((payload, errors), ({}, ['total']))
@@ -1,11 +1,83 @@
 # encoding: utf-8
 from __future__ import unicode_literals
 
-from django.template import Context
+import datetime
+import hashlib
+import re
+
+from django.conf import settings
+from django.template import Context, Engine, TemplateDoesNotExist
 from django.template.loader import get_template
 from django.db.models import Q
 from django import forms
-from django.utils.translation import ugettext_lazy as _
+from django.utils import timezone
+from django.utils.encoding import force_bytes, force_text
+from django.utils.formats import get_format
+from django.utils.translation import get_language, ugettext_lazy as _
+
+from . import fulltext
+from . import lookups  # noqa, registers the inlist lookup
+from .cache import LayeredCache, make_key
+
+
+#: HTML of unbound subforms, see BaseUpdater.render_unbound()
+fragment_cache = LayeredCache('FILTERS_FRAGMENT_CACHE', default_timeout=86400)
+
+_template_versions = {}
+
+VALUE_SEPARATOR_RE = re.compile(r'[\n,;]')
+
+
+def template_version(name):
+    """
+    Hash of the source of template `name`, read once per process, so cached
+    fragments of a changed template are not served after a deploy.
+    """
+    try:
+        return _template_versions[name]
+    except KeyError:
+        pass
+    loaders = list(Engine.get_default().template_loaders)
+    version = ''
+    while loaders:
+        loader = loaders.pop(0)
+        # the cached loader wraps the loaders reading the sources
+        loaders[:0] = getattr(loader, 'loaders', [])
+        try:
+            source = loader.load_template_source(name)[0]
+        except (TemplateDoesNotExist, NotImplementedError):
+            continue
+        version = hashlib.md5(force_bytes(source)).hexdigest()[:12]
+        break
+    _template_versions[name] = version
+    return version
+
+
+def local_today():
+    if settings.USE_TZ:
+        return timezone.localtime(timezone.now()).date()
+    return datetime.date.today()
+
+
+def day_start(day):
+    """
+    Midnight starting `day` in the active time zone, aware if USE_TZ.
+    """
+    value = datetime.datetime.combine(day, datetime.time.min)
+    if not settings.USE_TZ:
+        return value
+    import pytz
+    tz = timezone.get_current_timezone()
+    try:
+        return timezone.make_aware(value, tz)
+    except pytz.InvalidTimeError:
+        # midnight skipped or repeated by a DST change
+        return tz.localize(value, is_dst=False)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1)
 
 
 class EmptyForm(forms.Form):
@@ -16,6 +88,16 @@ class CharForm(forms.Form):
     value = forms.CharField(label=_('Value'), max_length=255)
 
 
+class FullTextForm(forms.Form):
+    value = forms.CharField(label=_('Words'), max_length=255)
+
+    def clean_value(self):
+        value = self.cleaned_data['value']
+        if not fulltext.words(value):
+            raise forms.ValidationError(_('Enter at least one word'))
+        return value
+
+
 class DateRangeForm(forms.Form):
     start = forms.DateField(label=_('Start'))
     end = forms.DateField(label=_('End'))
@@ -29,6 +111,38 @@ class DateForm(forms.Form):
     value = forms.DateField(label=_('Date'))
 
 
+class PeriodFormMixin(object):
+    """
+    Puts the (start, end) dates computed by `period(cleaned_data, today)`
+    into cleaned_data['period'] on validation.
+    """
+    def __init__(self, *args, **kwargs):
+        self.period = kwargs.pop('period')
+        super(PeriodFormMixin, self).__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super(PeriodFormMixin, self).clean()
+        if not self._errors:
+            cleaned_data['period'] = self.period(cleaned_data, local_today())
+        return cleaned_data
+
+
+class PeriodForm(PeriodFormMixin, forms.Form):
+    pass
+
+
+class DatePeriodForm(PeriodFormMixin, DateForm):
+    pass
+
+
+class DateRangePeriodForm(PeriodFormMixin, DateRangeForm):
+    pass
+
+
+class LastDaysForm(PeriodFormMixin, forms.Form):
+    value = forms.IntegerField(label=_('Days'), min_value=1, max_value=3660)
+
+
 class ChoiceForm(forms.Form):
     def __init__(self, *args, **kwargs):
         qs = kwargs.pop('queryset')
@@ -40,281 +154,518 @@ class ChoiceForm(forms.Form):
 
 
 class ChoiceMultiForm(forms.Form):
-    values = forms.MultipleChoiceField(label=_('Values'))
+    def __init__(self, *args, **kwargs):
+        choices = kwargs.pop('choices')
+        super(ChoiceMultiForm, self).__init__(*args, **kwargs)
+        self.fields['values'] = forms.MultipleChoiceField(label=_('Values'), choices=choices)
+
+
+class ValueListTextarea(forms.Textarea):
+    """
+    Textarea that also reads the value repeated in the query string, as
+    payload_params() writes cleaned lists.
+    """
+    def value_from_datadict(self, data, files, name):
+        if hasattr(data, 'getlist'):
+            return '\n'.join(data.getlist(name))
+        return data.get(name)
+
+
+class ValueListForm(forms.Form):
+    value = forms.CharField(label=_('Values'), widget=ValueListTextarea(attrs={'rows': 4}))
+
+    def __init__(self, *args, **kwargs):
+        self.to_python = kwargs.pop('to_python')
+        super(ValueListForm, self).__init__(*args, **kwargs)
+
+    def clean_value(self):
+        items = [item.strip() for item in VALUE_SEPARATOR_RE.split(self.cleaned_data['value'])]
+        items = [item for item in items if item]
+        max_values = getattr(settings, 'FILTERS_IN_MAX_VALUES', 50000)
+        if len(items) > max_values:
+            raise forms.ValidationError(_('Enter at most %(max)d values.'), params={'max': max_values})
+        values, invalid = set(), []
+        for item in items:
+            try:
+                values.add(self.to_python(item))
+            except forms.ValidationError:
+                invalid.append(item)
+        if invalid:
+            raise forms.ValidationError(_('Invalid values: %(values)s'), params={'values': ', '.join(invalid[:10])})
+        return sorted(values)
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select for select2 ajax mode: renders only the currently selected object,
+    the rest is loaded from the autocomplete view.
+    """
+    def __init__(self, filter_name, queryset, label_from_instance, attrs=None):
+        attrs = dict(attrs or {}, **{'data-autocomplete': filter_name})
+        super(AutocompleteSelect, self).__init__(attrs)
+        self.queryset = queryset
+        self.label_from_instance = label_from_instance
+
+    def render_options(self, choices, selected_choices):
+        selected_choices = set(force_text(v) for v in selected_choices if v not in ('', None))
+        output = [self.render_option(selected_choices, '', '---------')]
+        if selected_choices:
+            for obj in self.queryset.filter(pk__in=selected_choices):
+                output.append(self.render_option(selected_choices, obj.pk, self.label_from_instance(obj)))
+        return '\n'.join(output)
 
 
 class ModelChoiceForm(forms.Form):
     def __init__(self, *args, **kwargs):
         qs = kwargs.pop('queryset')
         select2 = kwargs.pop('select2')
+        autocomplete = kwargs.pop('autocomplete', None)
+        label_from_instance = kwargs.pop('label_from_instance', force_text)
         super(ModelChoiceForm, self).__init__(*args, **kwargs)
         self.queryset = qs
         self.select2 = select2
         self.fields['value'] = forms.ModelChoiceField(label=_('Choice'), queryset=qs)
+        if autocomplete is not None:
+            # ModelChoiceField.clean() only looks up the submitted pk, so
+            # nothing here iterates over the whole queryset.
+            self.fields['value'].widget = AutocompleteSelect(autocomplete, qs, label_from_instance)
+
+
+class BoundUpdater(object):
+    """
+    Per-request state of an updater: its form, the data it was bound to and
+    the validation error flag. The updater itself is shared between requests
+    and is never modified. The form is only built when it is first accessed.
+    """
+    __slots__ = ('updater', 'filter', 'name', 'data', 'error', '_form')
+
+    def __init__(self, updater, filter_, name, data=None):
+        self.updater = updater
+        self.filter = filter_
+        self.name = name
+        self.data = data
+        self.error = False
+        self._form = None
+
+    @property
+    def title(self):
+        return self.updater.title
+
+    @property
+    def form(self):
+        if self._form is None:
+            self._form = self.updater.get_form(self.filter, self.name, self.data)
+        return self._form
+
+    def render(self):
+        if self.data is None and self._form is None:
+            return self.updater.render_unbound(self.filter, self.name)
+        return self.updater.render(self.form)
+
+    def get_q(self):
+        if self.form.is_valid():
+            return self.updater.get_q(self.name, self.form.cleaned_data)
+        elif self.data is not None:
+            self.error = True
+        return None
+
+    def proceed(self, qs):
+        q = self.get_q()
+        if q is not None:
+            qs = qs.filter(q)
+        return qs
 
 
 class BaseUpdater(object):
     creation_counter = 0
-    form = None
     formclass = None
-    name = None
+    #: field lookup used by get_q(), for index analysis
+    lookup = None
     template = 'ww_filters/default.html'
-    error = False
 
     def __init__(self, title):
         self.title = title
         self.creation_counter = BaseUpdater.creation_counter
         BaseUpdater.creation_counter += 1
 
-    def render(self):
+    def render(self, form):
         tpl = get_template(self.template)
-        c = Context({'form': self.form})
+        c = Context({'form': form})
         return tpl.render(c)
 
-    def update_qs(self, qs):
-        pass
-
-    def proceed(self, name, data, qs):
-        self.name = name
-        self.form = self.formclass(data, prefix=name + '_filter')
-        if self.form.is_valid():
-            qs = self.update_qs(qs)
-        elif data is not None:
-            self.error = True
-        return qs
+    def render_unbound(self, filter_, name):
+        """
+        Renders the empty subform. The output depends only on the updater, its
+        filter options, the prefix, the template and the active language, so
+        it is cached by these; templates are versioned by the hash of their
+        source and FILTERS_FRAGMENT_CACHE_VERSION, and the cache is bypassed
+        with DEBUG on.
+        """
+        variant = self.fragment_variant(filter_)
+        if variant is None or settings.DEBUG or not fragment_cache.enabled:
+            return self.render(self.get_form(filter_, name, None))
+        key = make_key('fragment', type(self).__module__, type(self).__name__, name + '_filter', self.template,
+                       template_version(self.template), get_language(),
+                       getattr(settings, 'FILTERS_FRAGMENT_CACHE_VERSION', ''), variant)
+        html = fragment_cache.get(key)
+        if html is None:
+            html = self.render(self.get_form(filter_, name, None))
+            fragment_cache.set(key, html)
+        return html
+
+    def fragment_variant(self, filter_):
+        """
+        Part of the fragment cache key that depends on filter options, or None
+        if the empty subform can not be cached.
+        """
+        return ''
+
+    def get_form(self, filter_, name, data):
+        return self.formclass(data, prefix=name + '_filter')
+
+    def bind(self, filter_, name, data=None):
+        return BoundUpdater(self, filter_, name, data)
+
+    def get_q(self, name, data):
+        # updaters used to override update_qs(self, qs) and read self.name
+        # and self.form; those would now silently match every row
+        raise NotImplementedError('%s must define get_q(name, data) returning the Q of its condition, '
+                                  'update_qs(qs) is no longer called' % type(self).__name__)
+
+    def update_qs(self, qs, name, data):
+        return qs.filter(self.get_q(name, data))
 
 
 class CharEqual(BaseUpdater):
     formclass = CharForm
+    lookup = 'exact'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            self.name: self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            name: data['value']
         })
 
 
 class StartsWith(BaseUpdater):
     formclass = CharForm
+    lookup = 'istartswith'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            '__'.join([self.name, 'istartswith']): self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'istartswith']): data['value']
         })
 
 
 class EndsWith(BaseUpdater):
     formclass = CharForm
+    lookup = 'iendswith'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            '__'.join([self.name, 'iendswith']): self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'iendswith']): data['value']
         })
 
 
 class Contains(BaseUpdater):
     formclass = CharForm
+    lookup = 'icontains'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            '__'.join([self.name, 'icontains']): self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'icontains']): data['value']
+        })
+
+
+class FullText(BaseUpdater):
+    formclass = FullTextForm
+    lookup = 'fulltext'
+
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'fulltext']): data['value']
         })
 
 
 class ModelChoice(BaseUpdater):
     formclass = ModelChoiceForm
-    queryset = None
+    lookup = 'exact'
 
-    def proceed(self, name, data, qs):
-        self.name = name
-        self.form = self.formclass(data, queryset=self.queryset, prefix=name + '_filter',
-                                   select2=getattr(self, 'select2', None))
-        if self.form.is_valid():
-            qs = self.update_qs(qs)
-        elif data is not None:
-            self.error = True
-        return qs
+    def get_form(self, filter_, name, data):
+        return self.formclass(data, queryset=filter_.queryset, prefix=name + '_filter', select2=filter_.select2,
+                              autocomplete=name if filter_.autocomplete else None,
+                              label_from_instance=filter_.label_from_instance)
+
+    def fragment_variant(self, filter_):
+        # without autocomplete the subform lists the current database rows
+        return 'autocomplete' if filter_.autocomplete else None
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            self.name: self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            name: data['value']
         })
 
 
 class Choice(BaseUpdater):
     formclass = ChoiceForm
-    queryset = None
+    lookup = 'exact'
 
-    def proceed(self, name, data, qs):
-        self.name = name
-        self.form = self.formclass(data, queryset=self.queryset, prefix=name + '_filter',
-                                   select2=getattr(self, 'select2', None))
-        if self.form.is_valid():
-            qs = self.update_qs(qs)
-        elif data is not None:
-            self.error = True
-        return qs
+    def get_form(self, filter_, name, data):
+        return self.formclass(data, queryset=filter_.choices, prefix=name + '_filter', select2=filter_.select2)
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            self.name: self.form.cleaned_data['value']
+    def fragment_variant(self, filter_):
+        return make_key(filter_.select2, [(force_text(k), force_text(v)) for k, v in filter_.choices])
+
+    def get_q(self, name, data):
+        return Q(**{
+            name: data['value']
         })
 
 
 class ChoiceIn(BaseUpdater):
     formclass = ChoiceMultiForm
+    lookup = 'in'
+
+    def get_form(self, filter_, name, data):
+        return self.formclass(data, choices=filter_.choices, prefix=name + '_filter')
+
+    def fragment_variant(self, filter_):
+        return make_key([(force_text(k), force_text(v)) for k, v in filter_.choices])
+
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'in']): data['values']
+        })
+
+
+class In(BaseUpdater):
+    """
+    Pasted list of values separated by new lines, commas or semicolons,
+    converted by the filter's to_python().
+    """
+    formclass = ValueListForm
+    lookup = 'inlist'
+
+    def get_form(self, filter_, name, data):
+        return self.formclass(data, to_python=filter_.to_python, prefix=name + '_filter')
+
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'inlist']): data['value']
+        })
+
+
+class ModelIn(In):
+    # related fields accept only the built-in lookups, so the lookup goes
+    # through the primary key (the join is trimmed)
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            '__'.join([self.name, 'in']): self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'pk', 'inlist']): data['value']
         })
 
 
 class DateRange(BaseUpdater):
     formclass = DateRangeForm
     template = 'ww_filters/daterange.html'
+    lookup = 'range'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            '__'.join([self.name, 'range']): [self.form.cleaned_data['start'], self.form.cleaned_data['end']]
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'range']): [data['start'], data['end']]
         })
 
 
 class DateEqual(BaseUpdater):
     formclass = DateForm
     template = 'ww_filters/date.html'
+    lookup = 'exact'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            self.name: self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            name: data['value']
         })
 
 
-class DateToday(BaseUpdater):
-    formclass = EmptyForm
+class PeriodUpdater(BaseUpdater):
+    """
+    Selects the days [start, end) of a period as a half-open range, which a
+    B-tree index can serve. The period is computed from the form data and
+    the current date in the active time zone once, when the form is
+    validated, and kept out of saved payloads, so saved filters stay
+    relative. For DateTimeFields (`for_datetime = True`) the bounds are
+    local midnights.
+    """
+    formclass = PeriodForm
+    lookup = 'range'
+    for_datetime = False
+
+    def get_form(self, filter_, name, data):
+        return self.formclass(data, prefix=name + '_filter', period=self.period)
+
+    def period(self, data, today):
+        raise NotImplementedError
+
+    def bound(self, day):
+        return day_start(day) if self.for_datetime else day
+
+    def get_q(self, name, data):
+        start, end = data['period']
+        return Q(**{
+            '__'.join([name, 'gte']): self.bound(start),
+            '__'.join([name, 'lt']): self.bound(end),
+        })
 
-    def update_qs(self, qs):
-        from datetime import date
 
-        return qs.filter(**{
-            self.name: date.today()
-        })
+class DateToday(PeriodUpdater):
+    def period(self, data, today):
+        return today, today + datetime.timedelta(days=1)
 
 
-class DateTimeRange(BaseUpdater):
-    formclass = DateRangeForm
-    template = 'ww_filters/daterange.html'
+class DateTimeToday(DateToday):
+    for_datetime = True
 
-    def update_qs(self, qs):
-        import datetime
 
-        return qs.filter(**{
-            '__'.join([self.name, 'range']): [
-                datetime.datetime.combine(self.form.cleaned_data['start'], datetime.time.min),
-                datetime.datetime.combine(self.form.cleaned_data['end'], datetime.time.max)
-            ]
-        })
+class DateTimeRange(PeriodUpdater):
+    formclass = DateRangePeriodForm
+    template = 'ww_filters/daterange.html'
+    for_datetime = True
 
+    def period(self, data, today):
+        return data['start'], data['end'] + datetime.timedelta(days=1)
 
-class DateTimeEqual(BaseUpdater):
-    formclass = DateForm
+
+class DateTimeEqual(PeriodUpdater):
+    formclass = DatePeriodForm
     template = 'ww_filters/date.html'
+    for_datetime = True
 
-    def update_qs(self, qs):
-        import datetime
+    def period(self, data, today):
+        return data['value'], data['value'] + datetime.timedelta(days=1)
 
-        return qs.filter(**{
-            '__'.join([self.name, 'range']): [
-                datetime.datetime.combine(self.form.cleaned_data['value'], datetime.time.min),
-                datetime.datetime.combine(self.form.cleaned_data['value'], datetime.time.max)
-            ]
-        })
 
+class LastDays(PeriodUpdater):
+    """The last `days` days, today included."""
+    formclass = LastDaysForm
 
-class DateTimeToday(BaseUpdater):
-    formclass = EmptyForm
+    def period(self, data, today):
+        return today - datetime.timedelta(days=data['value'] - 1), today + datetime.timedelta(days=1)
 
-    def update_qs(self, qs):
-        import datetime
 
-        return qs.filter(**{
-            '__'.join([self.name, 'range']): [
-                datetime.datetime.combine(datetime.date.today(), datetime.time.min),
-                datetime.datetime.combine(datetime.date.today(), datetime.time.max)
-            ]
-        })
+class DateTimeLastDays(LastDays):
+    for_datetime = True
+
+
+class ThisWeek(PeriodUpdater):
+    def period(self, data, today):
+        first_day = (int(get_format('FIRST_DAY_OF_WEEK')) - 1) % 7
+        start = today - datetime.timedelta(days=(today.weekday() - first_day) % 7)
+        return start, start + datetime.timedelta(days=7)
+
+
+class DateTimeThisWeek(ThisWeek):
+    for_datetime = True
+
+
+class ThisMonth(PeriodUpdater):
+    def period(self, data, today):
+        start = today.replace(day=1)
+        return start, add_months(start, 1)
+
+
+class DateTimeThisMonth(ThisMonth):
+    for_datetime = True
+
+
+class ThisQuarter(PeriodUpdater):
+    def period(self, data, today):
+        start = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+        return start, add_months(start, 3)
+
+
+class DateTimeThisQuarter(ThisQuarter):
+    for_datetime = True
 
 
 class IntegerEqual(BaseUpdater):
     formclass = IntegerForm
+    lookup = 'exact'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            self.name: self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            name: data['value']
         })
 
 
 class LessThan(BaseUpdater):
     formclass = IntegerForm
+    lookup = 'lt'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            '__'.join([self.name, 'lt']): self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'lt']): data['value']
         })
 
 
 class GreaterThan(BaseUpdater):
     formclass = IntegerForm
+    lookup = 'gt'
 
-    def update_qs(self, qs):
-        return qs.filter(**{
-            '__'.join([self.name, 'gt']): self.form.cleaned_data['value']
+    def get_q(self, name, data):
+        return Q(**{
+            '__'.join([name, 'gt']): data['value']
         })
 
 
 class IsNull(BaseUpdater):
     formclass = EmptyForm
+    lookup = 'isnull'
 
-    def update_qs(self, qs):
-        return qs.filter(**{'__'.join([self.name, 'isnull']): True})
+    def get_q(self, name, data):
+        return Q(**{'__'.join([name, 'isnull']): True})
 
 
 class NotNull(BaseUpdater):
     formclass = EmptyForm
+    lookup = 'isnull'
 
-    def update_qs(self, qs):
-        return qs.filter(**{'__'.join([self.name, 'isnull']): False})
+    def get_q(self, name, data):
+        return Q(**{'__'.join([name, 'isnull']): False})
 
 
 class Empty(BaseUpdater):
     formclass = EmptyForm
+    lookup = 'isnull'
 
-    def update_qs(self, qs):
-        return qs.filter(Q(**{'__'.join([self.name, 'isnull']): True}) | Q(**{self.name: u''}))
+    def get_q(self, name, data):
+        return Q(**{'__'.join([name, 'isnull']): True}) | Q(**{name: u''})
 
 
 class NotEmpty(BaseUpdater):
     formclass = EmptyForm
+    lookup = 'isnull'
 
-    def update_qs(self, qs):
-        return qs.filter(Q(**{'__'.join([self.name, 'isnull']): False}) & ~Q(**{self.name: u''}))
+    def get_q(self, name, data):
+        return Q(**{'__'.join([name, 'isnull']): False}) & ~Q(**{name: u''})
 
 
 class AllDirectory(BaseUpdater):
     formclass = EmptyForm
 
-    def update_qs(self, qs):
-        return qs
+    def get_q(self, name, data):
+        return Q()
 
 
 class TrueBoolean(BaseUpdater):
     formclass = EmptyForm
+    lookup = 'exact'
 
-    def update_qs(self, qs):
-        return qs.filter(**{self.name: True})
+    def get_q(self, name, data):
+        return Q(**{name: True})
 
 
 class FalseBoolean(BaseUpdater):
     formclass = EmptyForm
+    lookup = 'exact'
 
-    def update_qs(self, qs):
-        return qs.filter(**{self.name: False})
+    def get_q(self, name, data):
+        return Q(**{name: False})
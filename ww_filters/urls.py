@@ -4,4 +4,8 @@ from . import views
 urlpatterns = patterns('',
    url(r'^save/$', views.save_filter, name='save_filter'),
    url(r'^delete/(?P<pk>\d+)/$', views.delete_filter, name='delete_filter'),
+   url(r'^autocomplete/(?P<type_>[\w-]+)/(?P<name>\w+)/$', views.autocomplete, name='autocomplete'),
+   url(r'^export/(?P<type_>[\w-]+)\.(?P<format>csv|jsonl)$', views.export, name='export'),
+   url(r'^schema/(?P<type_>[\w-]+)/$', views.schema, name='schema'),
+   url(r'^subform/(?P<type_>[\w-]+)/(?P<name>\w+)/(?P<updater>\w+)/$', views.subform, name='subform'),
 )
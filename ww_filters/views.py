@@ -1,27 +1,23 @@
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import HttpResponse, get_object_or_404, redirect
+from django.http import Http404, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse, QueryDict
+from django.core.exceptions import ValidationError
 from django.conf import settings
 
-from . import models
-
-
-def check_filter_form_valid(filter_, data):
-    filter_params = {}
-    str_dct = data['data'][1:].split('&')
-    for param in str_dct:
-        param_data = param.split('=')
-        filter_params[param_data[0]] = param_data[1]
-    filter_collection = filter_[0](filter_[1].objects.none(), filter_params)
-    filter_collection.update_qs()
-    return any(f.error for f in filter_collection.filters.values())
+from . import export as export_, filters, models, schema as schema_
 
 
 def save_filter(request):
     data = request.GET
-    if check_filter_form_valid(settings.FILTERS_BY_TYPE.get(data['type']), data):
+    filter_ = settings.FILTERS_BY_TYPE.get(data['type'])
+    payload, errors = filter_[0].clean_payload(QueryDict(data['data'].lstrip('?')))
+    if errors:
         return HttpResponse('error')
     else:
-        models.SavedFilters.objects.create(name=data['name'], data=data['data'], user_id=data['user'], 
-                                           source=data['source'], type=data['type'])
+        saved_filter = models.SavedFilters(name=data['name'], user_id=data['user'], source=data['source'],
+                                           type=data['type'])
+        saved_filter.payload = payload
+        saved_filter.save()
         return HttpResponse('ok')
 
 
@@ -30,3 +26,74 @@ def delete_filter(request, pk):
     src = saved_filter.source
     saved_filter.delete()
     return redirect(src)
+
+
+@login_required
+def autocomplete(request, type_, name):
+    filter_ = settings.FILTERS_BY_TYPE.get(type_)
+    if filter_ is None:
+        raise Http404
+    model_filter = filter_[0].base_filters.get(name)
+    if not isinstance(model_filter, filters.BaseModelChoiceFilter):
+        raise Http404
+    page_size = getattr(settings, 'FILTERS_AUTOCOMPLETE_PAGE_SIZE', 20)
+    try:
+        rows, more = model_filter.autocomplete_page(request.GET.get('q'), request.GET.get('after'), page_size)
+    except ValidationError:
+        return HttpResponseBadRequest()
+    return JsonResponse({
+        'results': [{'id': pk, 'text': label} for pk, label in rows],
+        'more': more,
+        'next': rows[-1][0] if more else None,
+    })
+
+
+@login_required
+def subform(request, type_, name, updater):
+    filter_ = settings.FILTERS_BY_TYPE.get(type_)
+    if filter_ is None:
+        raise Http404
+    subfilter = filter_[0].base_filters.get(name)
+    if subfilter is None or updater not in subfilter.updaters:
+        raise Http404
+    return HttpResponse(subfilter.updaters[updater].bind(subfilter, name).render())
+
+
+@login_required
+def export(request, type_, format):
+    """
+    Streams the rows of the filtered collection with the columns given as
+    repeated `column` parameters, limited to the collection's
+    export_columns (the model's own fields by default).
+    """
+    filter_ = settings.FILTERS_BY_TYPE.get(type_)
+    if filter_ is None or format not in export_.CONTENT_TYPES:
+        raise Http404
+    collection, model = filter_
+    allowed = collection.export_columns
+    if allowed is None:
+        allowed = [f.name for f in model._meta.concrete_fields]
+    columns = request.GET.getlist('column') or list(allowed)
+    if any(column not in allowed for column in columns):
+        return HttpResponseBadRequest()
+    filter_collection = collection(model._default_manager.all(), request.GET)
+    return export_.export_response(filter_collection, columns, format, filename=type_)
+
+
+def schema(request, type_):
+    """
+    JSON schema of the collection of type_ with a strong ETag; clients
+    revalidate it with If-None-Match.
+    """
+    filter_ = settings.FILTERS_BY_TYPE.get(type_)
+    if filter_ is None:
+        raise Http404
+    content, etag = schema_.cached_schema(filter_[0], type_)
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Accept-Language, Cookie'
+    return response